@@ -0,0 +1,152 @@
+from cache import LRUCache
+
+IDENTITY = None
+
+TAG_CACHE = LRUCache('tagging')
+
+def tag_tokens(tokens):
+    '''Returns the (token, tag) list of the given tokens, consulting the tagging cache first.'''
+    return tag_token_lists([tokens])[0]
+
+def tag_token_lists(token_lists):
+    '''
+    Returns the (token, tag) list of each list of tokens, consulting the tagging cache first.
+    Distinct uncached token lists are tagged together in one call.
+    '''
+    keys = [tuple(tokens) for tokens in token_lists]
+    found = {}
+    for key in keys:
+        if key not in found:
+            found[key] = TAG_CACHE.get(key)
+
+    missing = [key for key, tagged in found.items() if tagged is None]
+    if missing:
+        import tagger
+        for key, tagged in zip(missing, tagger.tag_sents(missing)):
+            TAG_CACHE.put(key, tagged)
+            found[key] = tagged
+
+    return [list(found[key]) for key in keys]
+
+def analyze_messages(messages):
+    '''
+    Returns an AnalyzedMessage for each message, with tagging and sentiment computed for the
+    whole batch at once. Debug calls are left unanalyzed, as they are never classified.
+    '''
+    from sentiment_analysis import getBatchTaggedPositivity
+
+    analyzed = [m if isinstance(m, AnalyzedMessage) else AnalyzedMessage(m) for m in messages]
+    pending = [m for m in analyzed if not m._classified and not m.text.startswith('!DEBUG')]
+    if not pending:
+        return analyzed
+
+    untagged = [m for m in pending if m._tagged is None]
+    for m, tagged in zip(untagged, tag_token_lists([m.tokens for m in untagged])):
+        m._tagged = tagged
+    for m, positivity in zip(pending, getBatchTaggedPositivity([m.tagged for m in pending], [m.features for m in pending])):
+        m._positivity = positivity
+        m._classified = True
+
+    return analyzed
+
+def preload():
+    '''Loads the tokenizer and the tagger model ahead of their first use.'''
+    import tagger
+    from nltk.tokenize.casual import casual_tokenize
+    tagger.pos_tag(casual_tokenize('tofu'))
+
+class AnalyzedMessage:
+    '''
+    A message that is tokenized, tagged, lemmatized and classified at most once.
+
+    Each stage is computed on first access and kept, so the same object can be handed to
+    Understanding, Sentience and the sentiment classifier without any of them redoing the work.
+    '''
+
+    def __init__(self, text):
+        self.text = str(text)
+        self._words = None
+        self._tokens = None
+        self._tagged = None
+        self._toktags = None
+        self._tag_ids = None
+        self._features = None
+        self._positivity = None
+        self._classified = False
+
+    def __repr__(self):
+        return 'AnalyzedMessage(%r)' % self.text
+
+    def truncated(self, n):
+        '''
+        Returns a message with the same text, but tagged, parsed and classified as if it ended after
+        its first n tokens. Returns this message if it is not longer than that.
+        '''
+        if len(self.tokens) <= n:
+            return self
+        message = AnalyzedMessage(self.text)
+        message._tokens = self.tokens[:n]
+        message._words = self.words[:n]
+        return message
+
+    @property
+    def words(self):
+        '''Lowercased tokens of the message, used for simple keyword matching.'''
+        if self._words is None:
+            from nltk.tokenize.casual import casual_tokenize
+            self._words = casual_tokenize(self.text.lower(), reduce_len=True)
+        return self._words
+
+    @property
+    def tokens(self):
+        '''Tokens of the message as fed to the tagger, with the identity mention unwrapped.'''
+        if self._tokens is None:
+            global IDENTITY
+            if IDENTITY is None:
+                import positivity
+                IDENTITY = positivity.Sentience.getIdentity()
+
+            from nltk.tokenize.casual import casual_tokenize
+            s = self.text.replace('@' + IDENTITY, IDENTITY)
+            self._tokens = list(map(lambda x: 'I' if x == 'i' else x, casual_tokenize(s, reduce_len=True)))
+        return self._tokens
+
+    @property
+    def tagged(self):
+        '''Raw (token, tag) list as produced by the tagger.'''
+        if self._tagged is None:
+            self._tagged = tag_tokens(self.tokens)
+        return self._tagged
+
+    @property
+    def toktags(self):
+        '''(token, tag) list with the identity forced to a noun, as used by Understanding.'''
+        if self._toktags is None:
+            from queries import Understanding
+            self._toktags = list(map(lambda x: (x[0], 'NN') if Understanding.matches_target(x[0]) else x, self.tagged))
+        return self._toktags
+
+    @property
+    def tag_ids(self):
+        '''Integer ids of the tags in toktags, as a compact array.'''
+        if self._tag_ids is None:
+            from queries import tag_ids
+            self._tag_ids = tag_ids(self.toktags)
+        return self._tag_ids
+
+    @property
+    def features(self):
+        '''Lemmatized and cleaned tokens fed to the sentiment classifier.'''
+        if self._features is None:
+            from sentiment_analysis import getTaggedFeatures
+            self._features = getTaggedFeatures(self.tagged)
+        return self._features
+
+    @property
+    def positivity(self):
+        '''Raw classifier positivity between -1.0 and 1.0, or None if no classifier exists.'''
+        if not self._classified:
+            from sentiment_analysis import getTaggedPositivity
+            self._positivity = getTaggedPositivity(self.tagged, self.features)
+            self._classified = True
+        return self._positivity
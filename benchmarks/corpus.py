@@ -0,0 +1,89 @@
+import datetime
+import random
+
+IDENTITY = 'tofu'
+
+SUBJECTS = ['i', 'we', 'you', 'my cat', 'the weather', 'this game', 'our team', 'the exam', 'dinner', 'the movie']
+VERBS = ['go for a walk', 'sleep early', 'study tonight', 'buy the new phone', 'learn python', 'eat out', 'call her', 'play games', 'take a break', 'finish the project']
+NOUNS = ['cats', 'dogs', 'pizza', 'sushi', 'tea', 'coffee', 'rain', 'summer', 'winter', 'homework', 'music', 'mondays']
+ADJECTIVES = ['good', 'bad', 'fun', 'boring', 'nice', 'terrible', 'great', 'awful', 'cute', 'hard']
+USERS = ['alice', 'bob', 'carol', 'dave', 'erin', 'frank']
+
+QUESTION_TEMPLATES = [
+    '{target}should {subject} {verb}?',
+    '{target}is {noun} {adjective}',
+    '{target}do you like {noun}?',
+    '{target}will {subject} {verb} tomorrow',
+    '{target}are {noun} {adjective}?',
+    '{target}can {subject} {verb}',
+]
+EITHER_OR_TEMPLATES = [
+    '{target}{noun} or {noun2}?',
+    '{target}should {subject} {verb} or {verb2}',
+    '{target}is {noun} {adjective} or {adjective2}?',
+]
+GREETINGS = [
+    'hi tofu', 'hello @tofu', 'good morning tofu', 'morning tofu!', 'gn tofu', 'good night tofu', 'hey tofu', 'tofu',
+]
+SPAM = [
+    'lol', 'lmaooooo', 'aaaaaaaaaa', 'ok', 'hahahahaha', 'xd', '???', 'nice', 'same', 'bruh', ':)', 'www',
+]
+STATEMENTS = [
+    '{subject} think {noun} are {adjective}',
+    '{noun} are so {adjective} today',
+    'i really want to {verb}',
+    '{subject} said {noun} is {adjective}',
+    'not sure if {noun} are {adjective}',
+]
+
+def __fill(rng, template):
+    verb, verb2 = rng.sample(VERBS, 2)
+    noun, noun2 = rng.sample(NOUNS, 2)
+    adjective, adjective2 = rng.sample(ADJECTIVES, 2)
+    return template.format(
+        target=rng.choice(['', '', IDENTITY + ' ', IDENTITY + ', ', '@' + IDENTITY + ' ']),
+        subject=rng.choice(SUBJECTS), verb=verb, verb2=verb2, noun=noun, noun2=noun2,
+        adjective=adjective, adjective2=adjective2
+    )
+
+def question(rng):
+    return __fill(rng, rng.choice(QUESTION_TEMPLATES))
+
+def either_or(rng):
+    return __fill(rng, rng.choice(EITHER_OR_TEMPLATES))
+
+def greeting(rng):
+    return rng.choice(GREETINGS)
+
+def spam(rng):
+    return rng.choice(SPAM)
+
+def long_message(rng):
+    sentences = [__fill(rng, rng.choice(STATEMENTS + QUESTION_TEMPLATES)) for _ in range(rng.randint(3, 6))]
+    return ' '.join(s if s.endswith('?') else s + rng.choice(['.', '!', '...']) for s in sentences)
+
+#kind of message and its share of the corpus
+KINDS = [
+    ('question', question, 0.3),
+    ('either_or', either_or, 0.15),
+    ('greeting', greeting, 0.15),
+    ('spam', spam, 0.25),
+    ('long', long_message, 0.15),
+]
+
+def generate_messages(n, seed=0):
+    '''Returns n (kind, message) tuples, the same for every call with the same n and seed.'''
+    rng = random.Random(seed)
+    kinds = [k for k, _, _ in KINDS]
+    makers = {k: maker for k, maker, _ in KINDS}
+    weights = [w for _, _, w in KINDS]
+    return [(kind, makers[kind](rng)) for kind in rng.choices(kinds, weights=weights, k=n)]
+
+def write_message_history(path, n, seed=0, start=datetime.datetime(2021, 2, 14, 9, 0, 0)):
+    '''Writes a chat history of n messages in the format read by bulkprocessing, a few seconds apart.'''
+    rng = random.Random(seed)
+    t = start
+    with open(path, 'w') as f:
+        for _, message in generate_messages(n, seed=seed):
+            t += datetime.timedelta(seconds=rng.randint(1, 120))
+            f.write('[%s] %s: %s\n' % (t.strftime('%d/%m/%Y %H:%M:%S'), rng.choice(USERS), message))
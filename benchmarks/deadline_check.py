@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+'''
+Checks that questions answered past their deadline still follow the sentiment of the message.
+
+A clearly positive and a clearly negative yes/no question are answered with an expired deadline
+over many seeded conversations, at a time the mood is good, so the positive one should mostly be
+agreed with and the negative one mostly disagreed with. Every answer is taken twice, and must be
+the same both times:
+
+    $ python3 benchmarks/deadline_check.py
+    $ python3 benchmarks/deadline_check.py --conversations 500
+'''
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+POSITIVE = 'tofu is it a wonderful and lovely day, i am so happy?'
+NEGATIVE = 'tofu is it a terrible and awful day, i am so sad?'
+
+#answers Responder gives to yes/no questions it agrees and disagrees with
+AGREEING = {
+    "perhaps", "i believe yes", "yeah", "yes", "my deductions indicate yes", "maybe",
+    "i think so", "very likely", "most definitely", "yes indeed", "i'd say yes"
+}
+DISAGREEING = {
+    "maybe not", "my sources say no", "no", "nah", "i don't think so", "doubt it",
+    "probably not", "most definitely not", "i think no", "not at all"
+}
+
+def find_good_mood(day, seed):
+    '''Returns a time of the given day at which the primary mood of a new conversation is the highest.'''
+    from positivity import Sentience, SentienceState, VirtualClock
+    clock = VirtualClock()
+    Sentience.setClock(clock)
+    best = None
+    for hour in range(24):
+        clock.set(day + hour * 3600)
+        mood = Sentience.getMoodSnapshot(SentienceState(seed)).primary_mood
+        if best is None or mood > best[1]:
+            best = (clock.t, mood)
+    return best
+
+def answer_all(message, conversations, seed):
+    '''Returns the answer to message of each of the given number of new seeded conversations, past its deadline.'''
+    from engine import Deadline, Responder
+    from positivity import Sentience, SentienceState
+    answers = []
+    for i in range(conversations):
+        deadline = Deadline(0)
+        state = SentienceState(Sentience.getStreamSeed(i))
+        answers.append(Responder.generate_response(message, autoanswer_level=4, state=state, deadline=deadline))
+        if 'wholeMessageSentiment' not in deadline.degradations:
+            raise AssertionError('%r was answered without degrading' % message)
+    return answers
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks/deadline_check.py', description='Checks the answers given past a deadline.')
+    parser.add_argument('--conversations', type=int, default=200, help='seeded conversations each question is asked in')
+    parser.add_argument('--seed', type=int, default=0, help='seed of every random stream')
+    parser.add_argument('--day', type=float, default=1700006400, help='POSIX timestamp of the day to ask on')
+    args = parser.parse_args(argv)
+
+    from positivity import Sentience
+    Sentience.setSeed(args.seed)
+    t, mood = find_good_mood(args.day, args.seed)
+    print('asking at %d, with a primary mood of %.3f' % (t, mood))
+
+    failed = False
+    for message, expected, opposite in ((POSITIVE, AGREEING, DISAGREEING), (NEGATIVE, DISAGREEING, AGREEING)):
+        answers = answer_all(message, args.conversations, args.seed)
+        if answers != answer_all(message, args.conversations, args.seed):
+            print('%r: answers differ between runs' % message)
+            failed = True
+
+        matching = sum(a in expected for a in answers)
+        opposing = sum(a in opposite for a in answers)
+        print('%r: %d expected, %d opposite, %d undecided' % (message, matching, opposing, len(answers) - matching - opposing))
+        if matching <= 2 * opposing:
+            failed = True
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
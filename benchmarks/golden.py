@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+'''
+Records the output of query parsing over the synthetic corpus, and checks later changes against it.
+
+The output depends on the tagger and its data, so record and check in the same environment:
+
+    $ python3 benchmarks/golden.py --write golden.json     #before a change
+    $ python3 benchmarks/golden.py --check golden.json     #after it
+'''
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import corpus
+
+#edge cases not produced by the corpus: several sentences with and without a subject call, bare punctuation
+EXTRA_MESSAGES = [
+    'hello. how are you?',
+    'tofu, is it good? should i go. what do you think',
+    'tofu tofu tofu',
+    '???',
+    '...',
+    'is it good or bad? or neither?',
+    'i like cats, dogs and tea. do you?',
+    'tofu should i sleep or study? it is late. tofu are you there',
+    '@tofu why',
+    '',
+]
+
+def parse_all(messages):
+    '''Returns the parse of each message in every mode parse_queries supports.'''
+    from queries import Understanding
+    return [{
+        "message": m,
+        "split"  : Understanding.parse_queries(m),
+        "merged" : Understanding.parse_queries(m, merge_results=True),
+        "last"   : Understanding.parse_queries(m, single_sentence_only=True)
+    } for m in messages]
+
+def normalize(x):
+    #json turns tuples into lists, so compare both sides after a round trip
+    return json.loads(json.dumps(x))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks/golden.py', description='Records or checks the output of query parsing.')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--write', metavar='FILE', help='record the current output to FILE')
+    action.add_argument('--check', metavar='FILE', help='compare the current output with FILE')
+    parser.add_argument('--messages', type=int, default=2000, help='size of the synthetic message corpus')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic corpus')
+    args = parser.parse_args(argv)
+
+    messages = [m for _, m in corpus.generate_messages(args.messages, seed=args.seed)] + EXTRA_MESSAGES
+    results = normalize(parse_all(messages))
+
+    if args.write:
+        with open(args.write, 'w') as f:
+            json.dump(results, f)
+        print('recorded %d messages' % len(results))
+        return 0
+
+    with open(args.check) as f:
+        expected = json.load(f)
+    mismatches = [(e, r) for e, r in zip(expected, results) if e != r]
+    if len(expected) != len(results):
+        print('expected %d messages, got %d; record with the same --messages and --seed' % (len(expected), len(results)))
+        return 1
+    for e, r in mismatches[:10]:
+        print('mismatch for %r:\n  expected %s\n  got      %s' % (e["message"], json.dumps(e), json.dumps(r)))
+    print('%d of %d messages match' % (len(results) - len(mismatches), len(results)))
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
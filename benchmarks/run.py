@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+'''
+Benchmarks the hot paths of the bot over a fixed synthetic chat corpus.
+
+Results are written as json, with the throughput and latency percentiles of each benchmark.
+Given a previous result file with --compare, regressions beyond --threshold are reported and
+the exit status is non-zero.
+
+    $ python3 benchmarks/run.py --out results.json
+    $ python3 benchmarks/run.py --compare results.json
+    $ python3 benchmarks/run.py --input new.json --compare old.json
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import corpus
+
+#metrics compared between runs, and whether higher values are better
+COMPARED_METRICS = [('throughput', True), ('p50Ms', False), ('p95Ms', False), ('p99Ms', False)]
+
+def percentile(sorted_values, p):
+    '''Returns the p-th percentile of a sorted list, interpolating between the closest ranks.'''
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(latencies, items_per_call=1):
+    '''Returns the stats of a list of call latencies in seconds, each call handling items_per_call items.'''
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "calls"     : len(latencies),
+        "items"     : len(latencies) * items_per_call,
+        "totalS"    : total,
+        "throughput": len(latencies) * items_per_call / total if total > 0 else None,
+        "meanMs"    : total / len(latencies) * 1000 if latencies else None,
+        "p50Ms"     : percentile(latencies, 50) * 1000 if latencies else None,
+        "p95Ms"     : percentile(latencies, 95) * 1000 if latencies else None,
+        "p99Ms"     : percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+def clear_caches():
+    from cache import get_cache, get_cache_stats
+    for name in get_cache_stats():
+        get_cache(name).clear()
+
+def time_calls(fn, inputs, passes):
+    '''
+    Calls fn on every input, passes times over, and returns the latency of each call.
+    Caches are cleared before every pass, so repeated messages within a pass still hit them.
+    '''
+    latencies = []
+    for _ in range(passes):
+        clear_caches()
+        for x in inputs:
+            start = time.perf_counter()
+            fn(x)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+def time_subprocess(code, runs):
+    '''Returns the latency reported by each fresh interpreter running code, which prints its own timing.'''
+    latencies = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        latencies.append(float(out.stdout.strip().splitlines()[-1]))
+    return latencies
+
+def with_mood(fn):
+    '''Runs fn with a fresh seeded mood state and a virtual clock moving 30 seconds per message.'''
+    from positivity import Sentience, SentienceState, VirtualClock
+
+    clock = VirtualClock(datetime.datetime(2021, 2, 14, 12, 0, 0))
+    state = SentienceState(0)
+
+    def call(x):
+        clock.set(clock() + 30)
+        return fn(x, state)
+
+    def run(*args):
+        Sentience.setClock(clock)
+        try:
+            return time_calls(call, *args)
+        finally:
+            Sentience.setClock(None)
+    return run
+
+def run_benchmarks(messages, passes, history_size, cold_runs, only=None):
+    results = {}
+
+    def bench(name, run, *args, items_per_call=1):
+        if only and not any(o in name for o in only):
+            return
+        print('running %s...' % name, file=sys.stderr)
+        try:
+            results[name] = summarize(run(*args), items_per_call)
+        except Exception as e:
+            results[name] = {"error": '%s: %s' % (type(e).__name__, e)}
+
+    bench('coldStart.import', time_subprocess,
+          'import time; t = time.perf_counter(); import engine; print(time.perf_counter() - t)', cold_runs)
+    bench('coldStart.firstResponse', time_subprocess,
+          'import time; t = time.perf_counter(); from engine import Responder; Responder.generate_response("tofu should i sleep?", autoanswer_level=4); print(time.perf_counter() - t)', cold_runs)
+
+    from analysis import analyze_messages
+    from engine import Responder
+    from positivity import Sentience
+    from queries import Understanding
+    from sentiment_analysis import getSentencePositivity
+    from tagger import tag_sents
+    from nltk.tokenize.casual import casual_tokenize
+
+    Responder.warmup()
+    texts = [m for _, m in messages]
+
+    def analyzed():
+        #parsing and mood updates are timed on messages that are already tagged and classified
+        result = analyze_messages(texts)
+        for m in result:
+            m.toktags
+        return result
+
+    bench('parseQueries', time_calls, Understanding.parse_queries, analyzed(), passes)
+    tokenized = [casual_tokenize(m) for m in texts]
+    bench('tagSents', time_calls, tag_sents, [tokenized[i:i+100] for i in range(0, len(tokenized), 100)], passes, items_per_call=100)
+    bench('sentencePositivity', time_calls, getSentencePositivity, texts, passes)
+    bench('exposeToMessage', with_mood(lambda m, state: Sentience.exposeToMessage(m, state)), analyzed(), passes)
+    for level in range(5):
+        bench('generateResponse.level%d' % level,
+              with_mood(lambda m, state, level=level: Responder.generate_response(m, autoanswer_level=level, state=state)), texts, passes)
+
+    types = ['message', 'group message', 'no-spam message', 'private message', 'readonly message']
+    requests = [json.dumps({"type": types[i % len(types)], "contents": m, "conversation": str(i % 7)}) for i, m in enumerate(texts)]
+    requests += [json.dumps({"type": "status"}), '{"type": "message"', 'not json'] * max(1, len(texts) // 50)
+    bench('getInfo', time_calls, Responder.get_info, requests, passes)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.txt')
+        corpus.write_message_history(path, history_size)
+        from bulkprocessing import process_message_history
+        bench('processMessageHistory', time_calls, process_message_history, [path] * 3, 1, items_per_call=history_size)
+
+    return results
+
+def compare(old, new, threshold):
+    '''Prints the change of every compared metric, and returns the names of benchmarks that regressed beyond threshold.'''
+    regressions = []
+    print('%-28s %-11s %12s %12s %9s' % ('benchmark', 'metric', 'old', 'new', 'change'), file=sys.stderr)
+    for name in sorted(set(old) & set(new)):
+        for metric, higher_is_better in COMPARED_METRICS:
+            a, b = old[name].get(metric), new[name].get(metric)
+            if not a or b is None:
+                continue
+            change = b / a - 1
+            regressed = (change < -threshold) if higher_is_better else (change > threshold)
+            print('%-28s %-11s %12.3f %12.3f %+8.1f%%%s' % (name, metric, a, b, change * 100, '  REGRESSION' if regressed else ''), file=sys.stderr)
+            if regressed and name not in regressions:
+                regressions.append(name)
+    for name in sorted(set(old) ^ set(new)):
+        print('%-28s only in %s run' % (name, 'old' if name in old else 'new'), file=sys.stderr)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks/run.py', description='Benchmarks the hot paths of the bot.')
+    parser.add_argument('--messages', type=int, default=1000, help='size of the synthetic message corpus')
+    parser.add_argument('--passes', type=int, default=3, help='passes over the corpus per benchmark')
+    parser.add_argument('--history-size', type=int, default=50000, help='messages in the generated chat history')
+    parser.add_argument('--cold-runs', type=int, default=5, help='fresh interpreters started per cold start benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic corpus')
+    parser.add_argument('--only', action='append', help='only run benchmarks whose name contains this, may be repeated')
+    parser.add_argument('--out', help='file to write the results to, instead of standard output')
+    parser.add_argument('--input', help='read results from this file instead of running the benchmarks')
+    parser.add_argument('--compare', help='previous results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input) as f:
+            output = json.load(f)
+    else:
+        results = run_benchmarks(corpus.generate_messages(args.messages, seed=args.seed), args.passes,
+                                 args.history_size, args.cold_runs, only=args.only)
+        output = {
+            "meta": {
+                "time"       : datetime.datetime.now().isoformat(timespec='seconds'),
+                "python"     : platform.python_version(),
+                "platform"   : platform.platform(),
+                "messages"   : args.messages,
+                "passes"     : args.passes,
+                "historySize": args.history_size,
+                "seed"       : args.seed,
+            },
+            "benchmarks": results
+        }
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(output, f, indent=2)
+                f.write('\n')
+        else:
+            print(json.dumps(output, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare(previous["benchmarks"], output["benchmarks"], args.threshold)
+        if regressions:
+            print('%d benchmark(s) regressed: %s' % (len(regressions), ', '.join(regressions)), file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
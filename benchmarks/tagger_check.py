@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+'''
+Checks that the in-project tagger gives the same tags as nltk.pos_tag, and compares their speed.
+
+The regression corpus is the synthetic chat corpus, the edge cases of golden.py and, if installed,
+the tweets of NLTK's twitter_samples used to train the classifier:
+
+    $ python3 benchmarks/tagger_check.py
+    $ python3 benchmarks/tagger_check.py --messages 20000 --tweets 0
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import corpus
+import golden
+
+def load_tweets(n):
+    '''Returns up to n tokenized tweets from twitter_samples, or none if the corpus is not installed.'''
+    if n <= 0:
+        return []
+    from nltk.corpus import twitter_samples
+    from training import CORPUS_FILES
+    try:
+        return [tokens for f in CORPUS_FILES.values() for tokens in twitter_samples.tokenized(f)][:n]
+    except LookupError:
+        print('twitter_samples not installed, skipping tweets', file=sys.stderr)
+        return []
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks/tagger_check.py', description='Compares the tagger with nltk.pos_tag.')
+    parser.add_argument('--messages', type=int, default=5000, help='size of the synthetic message corpus')
+    parser.add_argument('--tweets', type=int, default=10000, help='tweets taken from twitter_samples')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic corpus')
+    args = parser.parse_args(argv)
+
+    from nltk.tag import pos_tag
+    from nltk.tokenize.casual import casual_tokenize
+    import tagger
+
+    messages = [m for _, m in corpus.generate_messages(args.messages, seed=args.seed)] + golden.EXTRA_MESSAGES
+    sentences = [casual_tokenize(m) for m in messages] + load_tweets(args.tweets)
+
+    #nltk.pos_tag loads its model on every call, so time it against a single loaded tagger as well
+    nltk_tagger = tagger.load_nltk_tagger()
+    start = time.perf_counter()
+    expected = [nltk_tagger.tag(list(tokens)) for tokens in sentences]
+    nltk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tagger.get_tagger()
+    load_time = time.perf_counter() - start
+    start = time.perf_counter()
+    result = tagger.tag_sents(sentences)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for tokens in sentences[:200]:
+        pos_tag(tokens)
+    pos_tag_time = (time.perf_counter() - start) / min(200, len(sentences)) * len(sentences)
+
+    mismatches = [(tokens, e, r) for tokens, e, r in zip(sentences, expected, result) if e != r]
+    for tokens, e, r in mismatches[:10]:
+        print('mismatch for %r:\n  expected %s\n  got      %s' % (' '.join(tokens), e, r))
+
+    tokens = sum(map(len, sentences))
+    print('%d sentences, %d tokens' % (len(sentences), tokens))
+    print('nltk.pos_tag (estimated)  %8.3fs' % pos_tag_time)
+    print('PerceptronTagger.tag      %8.3fs' % nltk_time)
+    print('tagger.tag_sents          %8.3fs  (+%.3fs to load)' % (batch_time, load_time))
+    print('%d of %d sentences match' % (len(sentences) - len(mismatches), len(sentences)))
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
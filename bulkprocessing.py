@@ -1,33 +1,128 @@
-def process_message_history(file='data.txt'):
+import datetime
+
+#timestamp formats tried in order after ISO 8601, as found in common chat exports
+TIME_FORMATS = [
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y, %H:%M:%S',
+    '%d/%m/%Y, %H:%M',
+    '%m/%d/%y, %I:%M:%S %p',
+    '%m/%d/%y, %I:%M %p',
+    '%d.%m.%y, %H:%M:%S',
+    '%d.%m.%y, %H:%M',
+    '%Y-%m-%d %I:%M:%S %p',
+    '%H:%M:%S',
+    '%H:%M',
+]
+
+def parse_timestamp(s):
+    '''Returns the datetime of a chat history timestamp, or None if it is not in a known format.'''
+    s = s.strip()
+    try:
+        return datetime.datetime.fromisoformat(s)
+    except ValueError:
+        pass
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    return None
+
+def iter_message_history(file='data.txt', parse_time=False):
+    '''
+    Streams a chat history in the format `[<datetime>] <user>: <message>` line by line,
+    yielding a (time, user, message) tuple per message.
+
+    Lines not starting with '[' continue the message before them, and anything before the
+    first message is skipped. Only one message is held in memory at a time.
+
+    If parse_time is True, times are parsed into datetimes (None if in an unknown format),
+    otherwise they are yielded as the raw string between the brackets.
+    '''
+    def make_message(time_parts, msg_parts):
+        time = ''.join(time_parts)
+        user, _, message = ''.join(msg_parts).partition(':')
+        return (parse_timestamp(time) if parse_time else time, user.strip().replace('\n',''), message.strip())
+
+    time_parts = []
+    msg_parts = []
+    in_message = False
+    in_time = False
+
     with open(file, 'r') as myfile:
-        data=myfile.read()
-
-    messages = []
-
-    was_newline = True
-    is_in_message = False
-    is_in_time = False
-    tmp_time = ''
-    tmp_msg = ''
-    for c in data:
-        if was_newline and c == '[':
-            is_in_time = True
-            is_in_message = False
-            was_newline = False
-            messages.append((tmp_time,tmp_msg.split(':')[0].strip().replace('\n',''),':'.join(tmp_msg.split(':')[1:]).strip()))
-            tmp_time = ''
-            tmp_msg = ''
-        elif is_in_time and c == ']':
-            is_in_time = False
-            is_in_message = True
-        elif is_in_time:
-            tmp_time += c
-        elif is_in_message:
-            tmp_msg += c
-            if c == '\n':
-                was_newline = True
-        if was_newline and c != '\n':
-            was_newline = False
-            is_in_message = True
-
-    return messages[1:]
+        for line in myfile:
+            if in_time:
+                #timestamps may span lines until the closing bracket
+                time, closed, rest = line.partition(']')
+                time_parts.append(time)
+                if closed:
+                    in_time = False
+                    msg_parts.append(rest)
+                continue
+
+            if line.startswith('['):
+                if in_message:
+                    yield make_message(time_parts, msg_parts)
+                in_message = True
+                time_parts = []
+                msg_parts = []
+
+                time, closed, rest = line[1:].partition(']')
+                time_parts.append(time)
+                if closed:
+                    msg_parts.append(rest)
+                else:
+                    in_time = True
+            elif in_message:
+                msg_parts.append(line)
+
+    if in_message:
+        yield make_message(time_parts, msg_parts)
+
+def process_message_history(file='data.txt', parse_time=False):
+    '''Returns the list of (time, user, message) tuples in a chat history, see iter_message_history.'''
+    return list(iter_message_history(file, parse_time=parse_time))
+
+def replay_message_history(file, outfile, autoanswer_level=2, chunk_size=256, seed=0):
+    '''
+    Replays a chat history through the responder as fast as possible, writing one json line
+    per message to outfile with the generated response and the mood right after the message.
+
+    Mood decay and curves follow a virtual clock set to each message's own timestamp, and the
+    replay starts from a fresh mood with decisions drawn from a stream seeded with seed, so
+    replaying the same history with the same seed gives the same results.
+    Messages with unparsable timestamps keep the time of the message before them.
+    '''
+    import json
+    from analysis import analyze_messages
+    from engine import Responder
+    from positivity import Sentience, SentienceState, VirtualClock
+
+    clock = VirtualClock()
+    state = SentienceState(seed)
+    Sentience.setClock(clock)
+
+    def replay_chunk(chunk):
+        for (time, user, message), analyzed in zip(chunk, analyze_messages([x[2] for x in chunk])):
+            if time is not None:
+                clock.set(time)
+            response = Responder.generate_response(analyzed, autoanswer_level=autoanswer_level, state=state)
+            outfile.write(json.dumps({
+                "time"    : time.isoformat() if time is not None else None,
+                "user"    : user,
+                "message" : message,
+                "response": response,
+                **Sentience.getDebugInfoDict(state)
+            }) + '\n')
+
+    try:
+        chunk = []
+        for entry in iter_message_history(file, parse_time=True):
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                replay_chunk(chunk)
+                chunk = []
+        replay_chunk(chunk)
+    finally:
+        Sentience.setClock(None)
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+
+def get_default_maxsize():
+    '''Returns the size of caches from TOFU_CACHE_SIZE, or 4096 if it is unset or not an integer.'''
+    try:
+        return max(0, int(os.environ.get('TOFU_CACHE_SIZE', 4096)))
+    except ValueError:
+        return 4096
+
+DEFAULT_MAXSIZE = get_default_maxsize()
+
+_caches = {}
+
+class LRUCache:
+    '''
+    Size-bounded least recently used cache with hit, miss and eviction counters.
+
+    A maxsize of 0 disables the cache entirely. Caches are registered by name so their
+    counters can be reported with get_cache_stats().
+    '''
+
+    def __init__(self, name, maxsize=None):
+        self.name = name
+        self.maxsize = DEFAULT_MAXSIZE if maxsize is None else max(0, int(maxsize))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+        _caches[name] = self
+
+    def __len__(self):
+        return len(self.__data)
+
+    def get(self, key, default=None):
+        '''Returns the value stored for key and marks it as recently used, or default if absent.'''
+        with self.__lock:
+            try:
+                value = self.__data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.__data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        '''Stores value for key, evicting the least recently used entries beyond maxsize.'''
+        if self.maxsize == 0:
+            return
+        with self.__lock:
+            self.__data[key] = value
+            self.__data.move_to_end(key)
+            self.__evict()
+
+    def resize(self, maxsize):
+        '''Changes the maximum number of entries, evicting immediately if needed.'''
+        with self.__lock:
+            self.maxsize = max(0, int(maxsize))
+            self.__evict()
+
+    def clear(self):
+        '''Removes all entries and resets the counters.'''
+        with self.__lock:
+            self.__data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def get_stats(self):
+        '''Returns the cache size and counters as a dictionary.'''
+        return {
+            "size"     : len(self.__data),
+            "maxSize"  : self.maxsize,
+            "hits"     : self.hits,
+            "misses"   : self.misses,
+            "evictions": self.evictions
+        }
+
+    def __evict(self):
+        while len(self.__data) > self.maxsize:
+            self.__data.popitem(last=False)
+            self.evictions += 1
+
+def get_cache(name):
+    '''Returns the registered cache with the given name, or None.'''
+    return _caches.get(name)
+
+def get_cache_stats():
+    '''Returns the stats of every registered cache, keyed by cache name.'''
+    return {name: cache.get_stats() for name, cache in _caches.items()}
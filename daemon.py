@@ -0,0 +1,174 @@
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+#request type of Responder.get_info answering at each autoanswer level; none answers at level 3
+MESSAGE_TYPES = {0: 'readonly message', 1: 'no-spam message', 2: 'message', 4: 'private message'}
+
+#seconds a daemon is kept running without clients, and waited for when starting
+DEFAULT_IDLE_TIMEOUT = 600
+START_TIMEOUT = 60
+
+def is_enabled():
+    '''Returns True if replies should go through the daemon, as set by the TOFU_DAEMON environment variable.'''
+    return os.environ.get('TOFU_DAEMON', '0') not in ('', '0') and hasattr(socket, 'AF_UNIX')
+
+def get_private_dir():
+    '''
+    Returns a directory only the current user can access, `tofu-<uid>` in $XDG_RUNTIME_DIR or the
+    temporary directory, creating it if needed. Returns None if it exists but is not a directory
+    owned by the current user and closed to everyone else, as another user could then listen
+    on the socket in it.
+    '''
+    path = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), 'tofu-%d' % os.getuid())
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return None
+    return path
+
+def get_socket_path():
+    '''
+    Returns the socket of the daemon, from TOFU_DAEMON_SOCKET or else in a directory private to the
+    current user. Returns None if no private directory can be made.
+    '''
+    path = os.environ.get('TOFU_DAEMON_SOCKET')
+    if path:
+        return path
+    directory = get_private_dir()
+    return os.path.join(directory, 'daemon.sock') if directory is not None else None
+
+def get_idle_timeout():
+    try:
+        return float(os.environ.get('TOFU_DAEMON_IDLE', DEFAULT_IDLE_TIMEOUT))
+    except ValueError:
+        return DEFAULT_IDLE_TIMEOUT
+
+class DaemonClient:
+    '''Connection to a running daemon, which is a ResponderServer on a Unix socket.'''
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = sock.makefile('rwb')
+
+    def get_info(self, d):
+        '''Returns the response of the daemon to a get_info request. Raises OSError if the daemon is gone.'''
+        self.file.write(d.encode('utf-8') + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionResetError('daemon closed the connection')
+        return line.decode('utf-8').rstrip('\n')
+
+    def generate_response(self, message, autoanswer_level=2):
+        '''
+        Returns the response of the daemon to a message, like Responder.generate_response.
+        Raises ValueError for autoanswer levels no request type answers at, such as 3.
+        '''
+        if autoanswer_level not in MESSAGE_TYPES:
+            raise ValueError('no request type answers at autoanswer level %r' % autoanswer_level)
+        res = json.loads(self.get_info(json.dumps({"type": MESSAGE_TYPES[autoanswer_level], "contents": message})))
+        if "error" in res:
+            raise ValueError(res["error"])
+        return res["response"]
+
+    def close(self):
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+def try_connect(path):
+    '''Returns a client of the daemon listening on path, or None if none is, or if it belongs to another user.'''
+    try:
+        if os.stat(path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return DaemonClient(sock)
+
+def start(path):
+    '''
+    Starts a daemon on path in the background and waits for it to accept connections.
+    Returns a client of it, or None if it failed to start in time.
+    '''
+    main = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'main.py')
+    with open(os.devnull, 'r+b') as devnull:
+        process = subprocess.Popen(
+            [sys.executable, main, 'serve', '--socket', path, '--idle-timeout', str(get_idle_timeout())],
+            stdin=devnull, stdout=devnull, stderr=devnull, start_new_session=True
+        )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline and process.poll() is None:
+        client = try_connect(path)
+        if client is not None:
+            return client
+        time.sleep(0.05)
+    return None
+
+def connect():
+    '''
+    Returns a client of the daemon, starting one if none is running, or None if it cannot be started.
+    A lock file next to the socket keeps concurrent callers from starting a daemon each.
+    '''
+    path = get_socket_path()
+    if path is None:
+        return None
+    client = try_connect(path)
+    if client is not None:
+        return client
+
+    import fcntl
+    try:
+        #never follow a link planted in place of the lock file
+        fd = os.open(path + '.lock', os.O_WRONLY | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+        with os.fdopen(fd, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return try_connect(path) or start(path)
+    except OSError:
+        return None
+
+class DaemonResponder:
+    '''
+    Generates responses through the daemon when it is enabled, keeping the models loaded between
+    invocations. Falls back to generating them in this process if the daemon is disabled, cannot
+    be started, or goes away.
+    '''
+
+    def __init__(self):
+        self.client = connect() if is_enabled() else None
+
+    def is_connected(self):
+        return self.client is not None
+
+    def generate_response(self, message, autoanswer_level=2):
+        #levels without a request type are answered here, keeping the connection for the others
+        if self.client is not None and autoanswer_level in MESSAGE_TYPES:
+            try:
+                return self.client.generate_response(message, autoanswer_level)
+            except (OSError, ValueError, KeyError):
+                self.client.close()
+                self.client = None
+
+        from engine import Responder
+        return Responder.generate_response(message, autoanswer_level=autoanswer_level)
@@ -1,17 +1,52 @@
-import random
-import datetime
 import json
 import os
 import hashlib
-
-from nltk.tokenize.casual import casual_tokenize
+import time
 
 from positivity import Sentience
 from queries import Understanding
+from analysis import AnalyzedMessage, analyze_messages
+from cache import get_cache_stats
+import metrics
 
 
 IDENTITY = Sentience.getIdentity()
 
+#tokens a message is cut down to when it cannot be analyzed whole within its deadline
+DEADLINE_TOKEN_LIMIT = 48
+
+class Deadline:
+    '''
+    Time budget of a response, in milliseconds from start, a time.perf_counter() value that
+    defaults to now.
+
+    Once generate_response expects to exceed it, it falls back to cheaper paths, each recorded
+    by name in degradations:
+    - `"truncated"`             : only the first DEADLINE_TOKEN_LIMIT tokens of the message are analyzed.
+    - `"wholeMessageSentiment"` : questions are answered from the sentiment of the whole message,
+                                  skipping the subject-predicate analysis of the question and its options.
+    '''
+
+    def __init__(self, ms, start=None):
+        self.time = (time.perf_counter() if start is None else start) + ms / 1000
+        self.degradations = []
+
+    def remaining(self):
+        '''Returns the seconds left, negative once exceeded.'''
+        return self.time - time.perf_counter()
+
+    def exceeded(self):
+        return self.remaining() <= 0
+
+    def degrade(self, path):
+        if path not in self.degradations:
+            self.degradations.append(path)
+            metrics.increment('degradations.' + path)
+
+    @property
+    def degraded(self):
+        return bool(self.degradations)
+
 __message_combos_cache = {}
 def _get_message_combos():
     global __message_combos_cache
@@ -34,7 +69,7 @@ def _get_message_combos():
 class Responder:
 
     @staticmethod
-    def process_debug_output(s):
+    def process_debug_output(s, state=None):
         D_STRUCTURE = s.startswith("!DEBUG_STRUCTURE")
         D_SENTIENCE = s.startswith("!DEBUG_SENTIENCE")
         D_QUERIES_VB = s.startswith("!DEBUG_QUERIES_VB")
@@ -47,7 +82,7 @@ class Responder:
             s = ' '.join(s.split(' ')[1:]).strip()
 
         if D_SENTIENCE:
-            x = Sentience.getDebugInfoAfterMessage(s).replace('\n',' ')
+            x = Sentience.getDebugInfoAfterMessage(s, state).replace('\n',' ')
             x2 = ' '
             for c in x:
                 if c != ' ' or x2[-1] != ' ':
@@ -86,6 +121,30 @@ class Responder:
 
         return None
 
+    @staticmethod
+    def warmup():
+        '''
+        Loads every resource that is otherwise loaded lazily on first use: the tagger, the
+        lemmatizer, stopwords, the sentiment classifier and the version hash.
+
+        Intended for long-running modes, so the first message is not slowed down.
+        Returns the seconds taken per resource.
+        '''
+        import analysis
+        import sentiment_analysis
+
+        timings = {}
+        for name, load in [
+                ("tagger", analysis.preload),
+                ("sentiment", sentiment_analysis.preload),
+                ("positivityThreshold", Sentience.preloadPositivityClassifier),
+                ("version", Responder.get_version)
+        ]:
+            start = time.perf_counter()
+            load()
+            timings[name] = time.perf_counter() - start
+        return timings
+
     __ai_version = None
     @staticmethod
     def get_version():
@@ -93,7 +152,8 @@ class Responder:
             try:
                 d = b""
                 get_path = lambda x: os.path.join(os.path.dirname(os.path.realpath(__file__)), x)
-                for fname in ["engine.py", "queries.py", "positivity.py", "sentiment_analysis.py"]:
+                #every module that decides how messages are tokenized, tagged, classified or answered
+                for fname in ["engine.py", "queries.py", "positivity.py", "sentiment_analysis.py", "analysis.py", "tagger.py", "naivebayes.py"]:
                     with open(get_path(fname), 'rb') as f:
                         d += f.read()
                 Responder.__ai_version = hashlib.sha1(d).hexdigest()
@@ -102,18 +162,30 @@ class Responder:
         return Responder.__ai_version
 
     @staticmethod
-    def get_info(d):
+    def get_info(d, analyzed=None, received=None):
         '''
         Retrieves data using the given json as parameters. Returns a json string.
 
         Accepts json input in the format:
         ```
         {
-            "type"     : "status" | "private message" | "group message" | "no-spam message" | "readonly message" | "message",
-            "contents"?: string
+            "type"         : "status" | "metrics" | "private message" | "group message" | "no-spam message" | "readonly message" | "message",
+            "contents"?    : string,
+            "conversation"?: string,
+            "deadlineMs"?  : number,
+            "id"?          : any
         }
         ```
 
+        The id, if given, is echoed back in the output so clients can pipeline requests.
+        Messages with a deadlineMs are answered through cheaper paths once the time since the
+        request was received is about to exceed it (see Deadline). Callers queueing requests pass
+        the time.perf_counter() value at which they read the request as received; otherwise the
+        time is counted from this call.
+        Messages and status requests with a conversation use and update the mood of that
+        conversation only, instead of the mood shared by all other requests.
+        An AnalyzedMessage of the contents may be passed in if it was already analyzed elsewhere.
+
         Types are:
         - `"message"                `: default for chats; respond sometimes if possible.
         - `"readonly message"       `: only reads messages; never respond.
@@ -125,30 +197,55 @@ class Responder:
         Returns a json output in the format:
         ```
         {
+            "id"?                : any,
+            "statusMessage"      : string,
             "primaryMood"        : number,
             "moodStability"      : number,
             "exposedPositivity"  : number,
             "positivityOverload" : bool,
-            "response"           : string | null
+            "response"           : string | null,
+            "degraded"?          : bool,
+            "degradations"?      : string[],
+            "caches"?            : { [name: string]: { "size", "maxSize", "hits", "misses", "evictions": number } }
         }
         ```
+        The caches field is only present for status requests. The degraded field is only present for
+        messages with a deadline, and is true if any cheaper path was taken, as listed in degradations.
+
+        Metrics requests instead return the latency histogram of each processing stage and the
+        request, message, response and error counters, as `{"id"?, "response": null, "metrics": {...}}`.
+
         or, if an error occurs:
         ```
         {
+            "id"?                : any,
             "error"              : string,
             "response"           : string | null
         }
         ```
         '''
+        start = time.perf_counter() if received is None else received
+        req = {}
         err = {}
         res = {"response": None}
         info = {}
+        state = None
+        deadline = None
+        metrics.increment('requests')
         try:
-            data = json.loads(d)
+            with metrics.stage('deserialize'):
+                data = json.loads(d)
+            if "id" in data:
+                req = {"id": data["id"]}
             t = data["type"].lower()
+            state = Sentience.getState(data["conversation"]) if "conversation" in data else None
             if t == "status":
-                info = Sentience.getDebugInfoDict()
-                return json.dumps({**info, **res})
+                info = Sentience.getDebugInfoDict(state)
+                with metrics.stage('serialize'):
+                    return json.dumps({**req, **info, **res, "caches": get_cache_stats()})
+            if t == "metrics":
+                with metrics.stage('serialize'):
+                    return json.dumps({**req, **res, "metrics": metrics.get_stats()})
 
             autoanswer_level = 0
             contents = str(data["contents"] if "contents" in data else None)
@@ -160,24 +257,54 @@ class Responder:
                 autoanswer_level = 2
             if t == "private message":
                 autoanswer_level = 4
+            if "deadlineMs" in data:
+                deadline = Deadline(float(data["deadlineMs"]), start)
         except:
             err = {"error": "malformed data"}
+            metrics.increment('errors')
             res["response"] = None
 
         try:
             if not err and "message" in t:
-                res["response"] = Responder.generate_response(contents, autoanswer_level=autoanswer_level)
+                if analyzed is not None and analyzed.text == contents:
+                    contents = analyzed
+                res["response"] = Responder.generate_response(contents, autoanswer_level=autoanswer_level, state=state, deadline=deadline)
+                if deadline is not None:
+                    res["degraded"] = deadline.degraded
+                    res["degradations"] = deadline.degradations
         except:
             err = {"error": "generated response is invalid"}
+            metrics.increment('errors')
             res["response"] = None
 
         if not err:
-            info = Sentience.getDebugInfoDict()
-        return json.dumps({**err, **res, **info})
+            info = Sentience.getDebugInfoDict(state)
+        with metrics.stage('serialize'):
+            return json.dumps({**req, **err, **res, **info})
 
 
     @staticmethod
-    def generate_response(s, autoanswer_level=2):
+    def generate_responses(messages, autoanswer_level=2, state=None):
+        '''
+        Generates a response for each of the given messages, in order.
+
+        autoanswer_level is either a single level for every message or a list with one level
+        per message, as in generate_response.
+
+        Tokenization, tagging and sentiment scoring run over the whole batch at once, while
+        mood updates and response selection still happen message by message, so the output
+        matches calling generate_response on each message in turn.
+        '''
+        if isinstance(autoanswer_level, int):
+            autoanswer_level = [autoanswer_level] * len(messages)
+        if len(autoanswer_level) != len(messages):
+            raise ValueError('expected one autoanswer level per message')
+
+        analyzed = analyze_messages(messages)
+        return [Responder.generate_response(m, autoanswer_level=level, state=state) for m, level in zip(analyzed, autoanswer_level)]
+
+    @staticmethod
+    def generate_response(s, autoanswer_level=2, state=None, deadline=None):
         '''
         Generates a response for the given message with the autoanswer_level (default 1).
 
@@ -187,18 +314,122 @@ class Responder:
         - 2: Respond sometimes if confident
         - 3: Respond whenever possible
         - 4: Always respond
+
+        The message may be a string or an AnalyzedMessage. The message is only tokenized,
+        tagged and classified once, and that analysis is shared by every stage below.
+
+        Cheaper checks run first, so each message only goes as far as its level allows: readonly
+        messages only update the mood, and level 1 messages are only parsed when they are
+        addressed to us or could get a reply anyway.
+
+        The mood of the given SentienceState is used and updated, or the shared default state if None.
+
+        If a Deadline is given, cheaper paths are taken once it is expected to be exceeded, and
+        recorded in it, so long messages still get a timely, if less considered, response.
         '''
 
-        debug_out = Responder.process_debug_output(s)
+        message = s if isinstance(s, AnalyzedMessage) else AnalyzedMessage(s)
+        s = message.text
+
+        metrics.increment('messages')
+        debug_out = Responder.process_debug_output(s, state)
         if debug_out:
+            metrics.increment('responses')
             return debug_out
 
+        #
+        # MOOD
+        #
+
+        #every message affects the mood, so tagging and sentiment always run
+        with metrics.stage('tokenize'):
+            message.tokens
+        if deadline is not None and not message._classified:
+            message = Responder.__analyze_within(message, deadline)
+        else:
+            with metrics.stage('tag'):
+                message.tagged
+            with metrics.stage('sentiment'):
+                message.positivity
+        with metrics.stage('moodUpdate'):
+            Sentience.exposeToMessage(message, state)
+
+        #readonly messages are never replied to, so nothing else is needed
+        if autoanswer_level == 0:
+            return None
+
+        #each stage is timed once per message, so the later steps have stages of their own
+        with metrics.stage('moodSnapshot'):
+            #every decision below sees the same mood, even if the clock moves while responding
+            snapshot = Sentience.getMoodSnapshot(state)
+
         #
         # SENTENCE PARSING
         #
 
-        words = casual_tokenize(s.lower(), reduce_len=True)
-        parsed_result = Understanding.parse_queries(s, merge_results=True)
+        with metrics.stage('words'):
+            words = message.words
+        with metrics.stage('toktags'):
+            message.toktags
+
+        #at level 1, a message not addressed to us can only get one of the misc responses, which need a
+        #good mood and either a short message or a mention of the name, so anything else ends here unparsed
+        if autoanswer_level == 1 and not Responder.__is_addressed(message):
+            identity = IDENTITY.lower()
+            if not (snapshot.primary_mood > 0.5 and snapshot.exposed_positivity >= 0 and
+                    (len(words) <= 5 or identity in words or identity == s.lower())):
+                return None
+
+        with metrics.stage('parseQueries'):
+            parsed_result = Understanding.parse_queries(message, merge_results=True)
+
+        with metrics.stage('responseSelection'):
+            response = Responder.__select_response(message, parsed_result, autoanswer_level, state, snapshot, deadline)
+        if response is not None:
+            metrics.increment('responses')
+        return response
+
+    #estimated seconds spent tagging and classifying each token, learnt from messages with a deadline
+    __analysis_cost = 0.0002
+
+    @staticmethod
+    def __analyze_within(message, deadline):
+        #tags and classifies the message, truncated first if it is not expected to finish in time
+        tokens = len(message.tokens)
+        if tokens > DEADLINE_TOKEN_LIMIT and tokens * Responder.__analysis_cost > deadline.remaining():
+            message = message.truncated(DEADLINE_TOKEN_LIMIT)
+            tokens = DEADLINE_TOKEN_LIMIT
+            deadline.degrade('truncated')
+
+        start = time.perf_counter()
+        with metrics.stage('tag'):
+            message.tagged
+        with metrics.stage('sentiment'):
+            message.positivity
+        if tokens:
+            Responder.__analysis_cost += ((time.perf_counter() - start) / tokens - Responder.__analysis_cost) * 0.1
+        return message
+
+    @staticmethod
+    def __has_time(deadline):
+        #returns False, recording the fallback, if the subject-predicate analysis no longer fits in the deadline
+        if deadline is None or not deadline.exceeded():
+            return True
+        deadline.degrade('wholeMessageSentiment')
+        return False
+
+    @staticmethod
+    def __is_addressed(message):
+        #cheapest first: the name has to appear somewhere before it can lead the message
+        if IDENTITY.lower() not in message.text.lower():
+            return False
+        return Understanding.parse_subject_message_target(message)[2]
+
+    @staticmethod
+    def __select_response(message, parsed_result, autoanswer_level, state, snapshot, deadline=None):
+        '''Picks the response to an analyzed and parsed message, given the mood right after reading it.'''
+        s = message.text
+        words = message.words
 
         subject_call = parsed_result["subject_call"]
         queries      = parsed_result["queries"]
@@ -210,30 +441,27 @@ class Responder:
         query_types = set(map(lambda x: x[1], queries))
         too_complicated = len(query_types) > 1 or len(queries) > 4
 
-        Sentience.exposeToMessage(s)
-        mood = Sentience.getPrimaryMood()
-
-        if autoanswer_level == 0:
-            return None
+        mood = snapshot.primary_mood
+        rng = Sentience.getRandom(state)
 
         #
         # Greetings
         #
         if queries == [] and statements == [] and tofu_targeted:
             #greeting likely
-            now = datetime.datetime.now()
+            now = snapshot.datetime
 
             if mood > 0.3:
                 if (6 <= now.hour <= 11) and 'morning' in words:
-                    return random.choice(['good morning', 'morning', 'おはよう']) + ('!' if mood > 0.75 else ('.' if mood < 0.5 else ''))
+                    return rng.choice(['good morning', 'morning', 'おはよう']) + ('!' if mood > 0.75 else ('.' if mood < 0.5 else ''))
                 if (19 <= now.hour <= 23 or now.hour <= 2) and ('night' in words or 'gn' in words):
-                    return random.choice(['good night', 'gn', 'おやすみ']) + ('.' if mood < 0.5 else '')
+                    return rng.choice(['good night', 'gn', 'おやすみ']) + ('.' if mood < 0.5 else '')
                 if 'hello' in words or 'hi' in words:
                     if mood > 0.7 or autoanswer_level >= 4:
-                        return random.choice(['hello!', 'hi!', 'こんにちは!'])
+                        return rng.choice(['hello!', 'hi!', 'こんにちは!'])
 
             if mood <= 0.3:
-                return random.choice(['bleh', 'o', 'meh', 'hmph'])
+                return rng.choice(['bleh', 'o', 'meh', 'hmph'])
 
         #
         # Query answering
@@ -241,7 +469,7 @@ class Responder:
 
         if too_complicated:
             if tofu_targeted:
-                return random.choice([
+                return rng.choice([
                     "i'm confused",
                     "interesting question",
                     "uh.. i am confused",
@@ -253,7 +481,7 @@ class Responder:
             return None
 
         if 'STD_QN' in query_types and tofu_targeted:
-            return random.choice([
+            return rng.choice([
                 "sorry, this question is not within my capabilities to answer",
                 "i can't answer that yet oops",
                 "sorry, the question is too open-ended for me",
@@ -266,7 +494,7 @@ class Responder:
         if 'YN_QN' in query_types and ((autoanswer_level >= 2 and not someone_else_targeted) or tofu_targeted):
             filtered_queries = list(filter(lambda x: x[1] == 'YN_QN', queries))
             if len(filtered_queries) == 1:
-                yes_opt = random.choice([
+                yes_opt = rng.choice([
                     "perhaps",
                     "i believe yes",
                     "yeah",
@@ -279,7 +507,7 @@ class Responder:
                     "yes indeed",
                     "i'd say yes"
                 ])
-                no_opt = random.choice([
+                no_opt = rng.choice([
                     "maybe not",
                     "my sources say no",
                     "no",
@@ -291,7 +519,7 @@ class Responder:
                     "i think no",
                     "not at all"
                 ])
-                rnd_opt = random.choice([
+                rnd_opt = rng.choice([
                     "i'm not sure about that",
                     "bleh",
                     "interesting question",
@@ -301,31 +529,38 @@ class Responder:
                     "my sources cannot be trusted"
                 ])
 
-                chosen = Sentience.decideResponseAgree(filtered_queries[0][0])
+                if Responder.__has_time(deadline):
+                    chosen = Sentience.decideResponseAgree(filtered_queries[0][0], state, snapshot=snapshot)
+                else:
+                    #the query is only a token list, while the whole message is already classified
+                    chosen = Sentience.decideResponseAgree(message, state, snapshot=snapshot, wholeMessageOnly=True)
                 if chosen is None:
                     return rnd_opt
                 return yes_opt if chosen else no_opt
 
             if len(filtered_queries) == 2:
-                opt_1 = random.choice([
+                opt_1 = rng.choice([
                     "first option",
                     "go with the first",
                     "the former"
                 ])
-                opt_2 = random.choice([
+                opt_2 = rng.choice([
                     "second option",
                     "on second thought, your second option",
                     "the latter"
                 ])
-                opt_nil = random.choice([
+                opt_nil = rng.choice([
                     "why not both",
                     "i can't find the answer to that",
                     "i think neither",
                     "can't decide, so i'll say yes"
                 ])
-                subj, pred1 = Understanding.parse_sentence_subject_predicate(filtered_queries[0][0])
-                _   , pred2 = Understanding.parse_sentence_subject_predicate(filtered_queries[1][0])
-                chosen = Sentience.decideResponseOptionsIndex(subj, [pred1, pred2])
+                if Responder.__has_time(deadline):
+                    subj, pred1 = Understanding.parse_sentence_subject_predicate(filtered_queries[0][0])
+                    _   , pred2 = Understanding.parse_sentence_subject_predicate(filtered_queries[1][0])
+                else:
+                    subj, pred1, pred2 = message, None, None
+                chosen = Sentience.decideResponseOptionsIndex(subj, [pred1, pred2], state, snapshot=snapshot)
                 if chosen == 0:
                     return opt_1
                 if chosen == 1:
@@ -333,21 +568,24 @@ class Responder:
                 return opt_nil
 
             if len(filtered_queries) > 2 and tofu_targeted:
-                subject = None
-                options = []
-                for query, _ in filtered_queries:
-                    res = Understanding.parse_sentence_subject_predicate(query)
-                    if subject is None:
-                        subject = res[0]
-                    options.append(res[1])
-                chosen = Sentience.decideResponseOptionsIndex(subject, options)
+                subject = message
+                options = [None] * len(filtered_queries)
+                if Responder.__has_time(deadline):
+                    subject = None
+                    options = []
+                    for query, _ in filtered_queries:
+                        res = Understanding.parse_sentence_subject_predicate(query)
+                        if subject is None:
+                            subject = res[0]
+                        options.append(res[1])
+                chosen = Sentience.decideResponseOptionsIndex(subject, options, state, snapshot=snapshot)
                 if chosen is None:
-                    return random.choice([
+                    return rng.choice([
                         "i can't decide",
                         "am a little confused here",
                         "not sure which one"
                     ])
-                return random.choice([
+                return rng.choice([
                     "option %d it is",
                     "i'll pick option %d",
                     "i think option %d",
@@ -357,14 +595,14 @@ class Responder:
         #
         # Misc responses
         #
-        if mood > 0.5 and Sentience.getExposedPositivity() >= 0 and autoanswer_level >= 1:
-            if not tofu_targeted and (IDENTITY.lower() in words or IDENTITY.lower() == s.lower()) and random.random() <= 0.1:
-                return random.choice(['hmm i heard my name', 'hmmmm', 'interesting', 'hm'])
+        if mood > 0.5 and snapshot.exposed_positivity >= 0 and autoanswer_level >= 1:
+            if not tofu_targeted and (IDENTITY.lower() in words or IDENTITY.lower() == s.lower()) and rng.random() <= 0.1:
+                return rng.choice(['hmm i heard my name', 'hmmmm', 'interesting', 'hm'])
             if len(words) <= 5:
                 combos = _get_message_combos()
 
                 words_copy = words.copy()
-                random.shuffle(words_copy)
+                rng.shuffle(words_copy)
 
                 for word in words_copy:
                     for w in [word, Understanding.remove_repeated_chars_word(word)]:
@@ -379,18 +617,18 @@ class Responder:
                             if autoanswer_level <= 1:
                                 w_response_chance **= 3
 
-                            if (tofu_tagged or random.random() <= w_response_chance):
-                                return random.choice(w_response)
+                            if (tofu_tagged or rng.random() <= w_response_chance):
+                                return rng.choice(w_response)
                             break
 
-        roll = random.random()
-        if Sentience.isExposedPositivityOverloaded():
+        roll = rng.random()
+        if snapshot.positivity_overload:
             roll **= 2
         if autoanswer_level >= 4 or (autoanswer_level >= 2 and roll > 0.95) or (tofu_targeted and roll > 0.75):
             if mood >= 0.3:
-                x = Sentience.determineMessagePositivity(s)
+                x = Sentience.determineMessagePositivity(message)
                 if x >= 0.6:
-                    return random.choice([
+                    return rng.choice([
                         'ay',
                         'nice',
                         ':D',
@@ -401,7 +639,7 @@ class Responder:
                     ])
 
                 if x < 0:
-                    return random.choice([
+                    return rng.choice([
                         'oof',
                         'ono',
                         'uh',
@@ -411,7 +649,7 @@ class Responder:
                         '.-.',
                     ])
 
-                return random.choice([
+                return rng.choice([
                     'hmm',
                     'ah',
                     'hm',
@@ -420,13 +658,10 @@ class Responder:
                 ])
 
 
-            return random.choice(['o', 'meh', 'm', '.'])
+            return rng.choice(['o', 'meh', 'm', '.'])
 
         return None
 
-#preloading
-Responder.get_version()
-
 #direct script execution
 if __name__ == "__main__" :
     print("version: " + Responder.get_version())
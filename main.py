@@ -11,7 +11,7 @@ if __name__ == "__main__":
         print('No arguments provided.')
 
     elif 'emulate' == argv[1] and len(argv) >= 3:
-        messages = process_message_history(argv[2])
+        messages = iter_message_history(argv[2])
         for message in messages:
             time.sleep(0.25)
             if message[1] == 'BOT tofu':
@@ -27,18 +27,30 @@ if __name__ == "__main__":
                 time.sleep(1)
                 print('* BOT tofu2 (emulated autoreply):\n' + x)
                 print()
+    elif 'replay' == argv[1] and len(argv) >= 3:
+        import sys
+        if len(argv) >= 4:
+            with open(argv[3], 'w') as f:
+                replay_message_history(argv[2], f)
+        else:
+            replay_message_history(argv[2], sys.stdout)
     elif argv[1] == 'reply' and len(argv) >= 3:
-        reply = Responder.generate_response(argv[2], autoanswer_level=4)
+        from daemon import DaemonResponder
+        reply = DaemonResponder().generate_response(argv[2], autoanswer_level=4)
         if reply is not None:
             print(reply)
     elif argv[1] == 'chat':
+        from daemon import DaemonResponder
+        responder = DaemonResponder()
+        if len(argv) == 2 and not responder.is_connected():
+            Responder.warmup()
         try:
             while True:
                 if len(argv) > 2:
                     s = argv[2]
                 else:
                     s = input()
-                reply = Responder.generate_response(s)
+                reply = responder.generate_response(s)
                 if reply is not None:
                     print(reply)
                 else:
@@ -48,21 +60,86 @@ if __name__ == "__main__":
         except KeyboardInterrupt:
             pass
     elif argv[1] == 'jsonio':
+        import argparse
+
+        parser = argparse.ArgumentParser(prog='main.py jsonio')
+        parser.add_argument('request', nargs='?', help='single request to answer, instead of reading standard input')
+        parser.add_argument('--workers', type=int, default=0, help='number of processes analysing messages')
+        args = parser.parse_args(argv[2:])
+        if args.request is not None and args.workers > 0:
+            parser.error('--workers only applies when reading requests from standard input')
+
+        if args.workers > 0:
+            from workers import run_jsonio
+            Responder.warmup()
+            try:
+                run_jsonio(args.workers)
+            except KeyboardInterrupt:
+                pass
+        else:
+            if args.request is None:
+                Responder.warmup()
+            try:
+                while True:
+                    if args.request is not None:
+                        s = args.request
+                    else:
+                        s = input()
+                    reply = Responder.get_info(s)
+                    if reply is not None:
+                        print(reply)
+                    else:
+                        print()
+                    if args.request is not None:
+                        break
+            except KeyboardInterrupt:
+                pass
+
+    elif argv[1] == 'batch':
+        import argparse
+        import sys
+        from workers import run_batch
+
+        parser = argparse.ArgumentParser(prog='main.py batch')
+        parser.add_argument('input', help='NDJSON file of requests, or - for standard input')
+        parser.add_argument('output', help='NDJSON file to write the responses to, or - for standard output')
+        parser.add_argument('--workers', type=int, default=0, help='number of processes analysing messages')
+        parser.add_argument('--chunk', type=int, default=256, help='requests read and analysed at a time')
+        args = parser.parse_args(argv[2:])
+
+        def report(stats):
+            print('%d requests, %d responses, %d errors in %.1fs (%.1f requests/s)' % (
+                stats["requests"], stats["responses"], stats["errors"], stats["seconds"], stats["throughput"] or 0), file=sys.stderr)
+
+        Responder.warmup()
+        infile = sys.stdin if args.input == '-' else open(args.input, 'r')
+        outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
         try:
-            while True:
-                if len(argv) > 2:
-                    s = argv[2]
-                else:
-                    s = input()
-                reply = Responder.get_info(s)
-                if reply is not None:
-                    print(reply)
-                else:
-                    print()
-                if len(argv) > 2:
-                    break
+            report(run_batch(infile, outfile, workers=max(0, args.workers), chunk_size=max(1, args.chunk), progress=report))
         except KeyboardInterrupt:
             pass
+        finally:
+            for f in (infile, outfile):
+                if f not in (sys.stdin, sys.stdout):
+                    f.close()
+    elif argv[1] == 'serve':
+        import argparse
+        from server import serve
+
+        parser = argparse.ArgumentParser(prog='main.py serve')
+        address = parser.add_mutually_exclusive_group(required=True)
+        address.add_argument('--socket', help='unix socket path to listen on')
+        address.add_argument('--port', type=int, help='tcp port to listen on')
+        parser.add_argument('--host', default='127.0.0.1', help='tcp host to listen on')
+        parser.add_argument('--max-in-flight', type=int, default=64, help='maximum number of requests processed at once')
+        parser.add_argument('--workers', type=int, default=0, help='number of processes analysing messages')
+        parser.add_argument('--idle-timeout', type=float, help='seconds without clients after which the server stops')
+        args = parser.parse_args(argv[2:])
 
+        Responder.warmup()
+        try:
+            serve(socket_path=args.socket, host=args.host, port=args.port, max_in_flight=args.max_in_flight, workers=args.workers, idle_timeout=args.idle_timeout)
+        except KeyboardInterrupt:
+            pass
     else:
         print("Invalid arguments.")
@@ -0,0 +1,119 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+#upper bounds of the latency histogram buckets, in milliseconds; the last bucket is unbounded
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_enabled = os.environ.get('TOFU_METRICS', '1') != '0'
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+_null_stage = contextlib.nullcontext()
+
+class Histogram:
+    '''
+    Latency histogram with fixed buckets, so recording is a bisect and an increment and the
+    memory used never grows. Histograms are registered by name to be reported with get_stats().
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.__lock = threading.Lock()
+        _histograms[name] = self
+
+    def observe(self, seconds):
+        '''Records one duration, given in seconds.'''
+        ms = seconds * 1000
+        i = bisect.bisect_left(BUCKET_BOUNDS_MS, ms)
+        with self.__lock:
+            self.count += 1
+            self.total += ms
+            if ms > self.max:
+                self.max = ms
+            self.buckets[i] += 1
+
+    def clear(self):
+        with self.__lock:
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+            self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def get_stats(self):
+        '''Returns the count, sum and maximum in milliseconds, and the count per bucket keyed by its upper bound.'''
+        with self.__lock:
+            buckets = {('%g' % bound): n for bound, n in zip(BUCKET_BOUNDS_MS, self.buckets)}
+            buckets['+Inf'] = self.buckets[-1]
+            return {
+                "count"  : self.count,
+                "sumMs"  : self.total,
+                "maxMs"  : self.max,
+                "buckets": buckets
+            }
+
+class _Stage:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+def is_enabled():
+    return _enabled
+
+def set_enabled(enabled):
+    '''Turns recording on or off. Disabled stages and counters cost a single check.'''
+    global _enabled
+    _enabled = bool(enabled)
+
+def stage(name):
+    '''
+    Returns a context manager recording the time spent in it to the histogram of the named stage.
+    Does nothing if metrics are disabled.
+    '''
+    if not _enabled:
+        return _null_stage
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.get(name) or Histogram(name)
+    return _Stage(histogram)
+
+def increment(name, n=1):
+    '''Adds n to the named counter, unless metrics are disabled.'''
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def clear():
+    '''Resets every histogram and counter.'''
+    with _lock:
+        for histogram in _histograms.values():
+            histogram.clear()
+        _counters.clear()
+
+def get_stats():
+    '''Returns the stats of every stage histogram and the value of every counter.'''
+    with _lock:
+        histograms = list(_histograms.values())
+        counters = dict(_counters)
+    return {
+        "enabled" : _enabled,
+        "stages"  : {histogram.name: histogram.get_stats() for histogram in histograms},
+        "counters": counters
+    }
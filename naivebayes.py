@@ -0,0 +1,150 @@
+import hashlib
+import mmap
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#flat model file layout, all little endian:
+#  header: magic, format version, label count, vocabulary size, string table size, sha1 of the payload, padding
+#  float64 label log probabilities [labels]
+#  float64 feature log probabilities [labels x vocabulary]
+#  uint32 string offsets [labels + vocabulary + 1]
+#  utf-8 string table, labels followed by the vocabulary
+MODEL_MAGIC = b'TOFUNB\0\0'
+MODEL_VERSION = 1
+
+def is_available():
+    '''Returns True if NumPy is installed and compiled classifiers can be used.'''
+    return numpy is not None
+
+class CompiledNaiveBayes:
+    '''
+    Naive Bayes scorer compiled from an NLTK NaiveBayesClassifier with binary features.
+
+    The vocabulary is mapped to integer ids, and the base 2 log probabilities of each
+    feature being present are kept as a dense (labels x vocabulary) array, so scoring is
+    an index gather and a sum. Features absent from a message do not contribute, exactly
+    as with NLTK's prob_classify.
+    '''
+
+    __HEADER = struct.Struct('<8sIIII20s4x')
+
+    def __init__(self, labels, vocabulary, label_logprobs, feature_logprobs, buffer=None):
+        self.labels = list(labels)
+        self.vocabulary = vocabulary
+        self.label_logprobs = label_logprobs
+        self.feature_logprobs = feature_logprobs
+        self.__buffer = buffer #keeps the memory map backing the arrays alive
+
+    @staticmethod
+    def from_nltk(classifier):
+        '''Compiles the given NLTK NaiveBayesClassifier.'''
+        labels = list(classifier.labels())
+        fnames = sorted(set(fname for _, fname in classifier._feature_probdist.keys()))
+        vocabulary = {fname: i for i, fname in enumerate(fnames)}
+
+        label_logprobs = numpy.array([classifier._label_probdist.logprob(label) for label in labels], dtype=numpy.float64)
+        feature_logprobs = numpy.full((len(labels), len(fnames)), -numpy.inf, dtype=numpy.float64)
+        for (label, fname), probdist in classifier._feature_probdist.items():
+            feature_logprobs[labels.index(label), vocabulary[fname]] = probdist.logprob(True)
+
+        return CompiledNaiveBayes(labels, vocabulary, label_logprobs, feature_logprobs)
+
+    @staticmethod
+    def load(path):
+        '''
+        Loads a compiled classifier saved with save().
+
+        The probability arrays are memory-mapped rather than read, so the pages are shared between
+        processes by the OS. The payload is checked against the sha1 in the header, and a ValueError
+        is raised if the file is truncated or corrupted.
+        '''
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, n_labels, n_vocab, strings_size, digest = CompiledNaiveBayes.__HEADER.unpack_from(buf, 0)
+        except struct.error:
+            buf.close()
+            raise ValueError('truncated model file: %s' % path)
+        if magic != MODEL_MAGIC or version != MODEL_VERSION:
+            buf.close()
+            raise ValueError('unsupported model file: %s' % path)
+
+        with memoryview(buf) as view:
+            payload_digest = hashlib.sha1(view[CompiledNaiveBayes.__HEADER.size:]).digest()
+        if payload_digest != digest:
+            buf.close()
+            raise ValueError('corrupted model file: %s' % path)
+
+        offset = CompiledNaiveBayes.__HEADER.size
+        label_logprobs = numpy.frombuffer(buf, dtype='<f8', count=n_labels, offset=offset)
+        offset += label_logprobs.nbytes
+        feature_logprobs = numpy.frombuffer(buf, dtype='<f8', count=n_labels*n_vocab, offset=offset).reshape(n_labels, n_vocab)
+        offset += feature_logprobs.nbytes
+        string_offsets = numpy.frombuffer(buf, dtype='<u4', count=n_labels+n_vocab+1, offset=offset).tolist()
+        offset += 4 * len(string_offsets)
+
+        strings = bytes(buf[offset:offset+strings_size]).decode('utf-8')
+        names = [strings[string_offsets[i]:string_offsets[i+1]] for i in range(n_labels + n_vocab)]
+        vocabulary = {fname: i for i, fname in enumerate(names[n_labels:])}
+
+        return CompiledNaiveBayes(names[:n_labels], vocabulary, label_logprobs, feature_logprobs, buffer=buf)
+
+    def save(self, path):
+        '''Saves the compiled classifier as a flat, memory-mappable model file.'''
+        fnames = sorted(self.vocabulary, key=self.vocabulary.get)
+
+        #offsets index characters rather than bytes, so the table is decoded once and sliced
+        strings = ''.join(self.labels + fnames)
+        string_offsets = [0]
+        for name in self.labels + fnames:
+            string_offsets.append(string_offsets[-1] + len(name))
+
+        payload = b''.join([
+            numpy.ascontiguousarray(self.label_logprobs, dtype='<f8').tobytes(),
+            numpy.ascontiguousarray(self.feature_logprobs, dtype='<f8').tobytes(),
+            numpy.array(string_offsets, dtype='<u4').tobytes(),
+            strings.encode('utf-8')
+        ])
+        header = CompiledNaiveBayes.__HEADER.pack(MODEL_MAGIC, MODEL_VERSION, len(self.labels), len(fnames),
+                                                   len(strings.encode('utf-8')), hashlib.sha1(payload).digest())
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+
+    def feature_ids(self, features):
+        '''Returns the ids of the distinct known features, ignoring features never seen in training.'''
+        vocabulary = self.vocabulary
+        ids = {vocabulary[f] for f in features if f in vocabulary}
+        return numpy.fromiter(ids, dtype=numpy.intp, count=len(ids))
+
+    def prob(self, features, label):
+        '''Returns the probability of label given an iterable of present features.'''
+        logprobs = self.label_logprobs + self.feature_logprobs[:, self.feature_ids(features)].sum(axis=1)
+        return float(self.__normalize(logprobs[:, None])[self.labels.index(label), 0])
+
+    def prob_batch(self, feature_lists, label):
+        '''Returns a NumPy array with the probability of label for each iterable of present features.'''
+        ids = [self.feature_ids(features) for features in feature_lists]
+        lengths = numpy.array([len(x) for x in ids], dtype=numpy.intp)
+        segments = numpy.repeat(numpy.arange(len(ids)), lengths)
+        flat_ids = numpy.concatenate(ids) if ids else numpy.zeros(0, dtype=numpy.intp)
+
+        logprobs = numpy.empty((len(self.labels), len(ids)), dtype=numpy.float64)
+        for i in range(len(self.labels)):
+            logprobs[i] = self.label_logprobs[i] + numpy.bincount(segments, weights=self.feature_logprobs[i, flat_ids], minlength=len(ids))
+        return self.__normalize(logprobs)[self.labels.index(label)]
+
+    @staticmethod
+    def __normalize(logprobs):
+        #normalize base 2 log probabilities per column, falling back to uniform when every label is impossible
+        peak = logprobs.max(axis=0)
+        impossible = numpy.isneginf(peak)
+        with numpy.errstate(invalid='ignore'):
+            probs = numpy.exp2(logprobs - numpy.where(impossible, 0.0, peak))
+        probs[:, impossible] = 1.0
+        return probs / probs.sum(axis=0)
@@ -1,12 +1,100 @@
+import os
 import time
 import datetime
 import random
 import math
+from collections import namedtuple
 
 from sentiment_analysis import getSentencePositivity
 from queries import Understanding
+from analysis import AnalyzedMessage
+
+class SentienceState:
+    """Mood state of a single conversation, which changes with the messages it is exposed to."""
+
+    __slots__ = ('exposed_positivity', 'last_message_exposure', 'positivity_overload', 'last_access', 'seed', 'draws')
+
+    def __init__(self, seed=None):
+        self.exposed_positivity = 0.0
+        self.last_message_exposure = 0.0
+        self.positivity_overload = False
+        self.last_access = 0.0
+        #decisions of this conversation are unpredictable unless seeded, see Sentience.getRandom
+        self.seed = seed
+        self.draws = 0
+
+class MoodSnapshot(namedtuple('MoodSnapshot', ['time', 'primary_mood', 'mood_stability', 'exposed_positivity', 'positivity_overload'])):
+    """
+    Immutable mood of a conversation at one point in time, as returned by Sentience.getMoodSnapshot.
+
+    Computing it decays the exposed positivity once, and every decision made for the same
+    message or status request reads from it, so their values are consistent with each other.
+    """
+    __slots__ = ()
+
+    @property
+    def datetime(self):
+        """Local datetime the snapshot was taken at."""
+        return datetime.datetime.fromtimestamp(self.time)
+
+class VirtualClock:
+    """Clock that only moves when set, for use with Sentience.setClock."""
+
+    def __init__(self, t=0.0):
+        self.set(t)
+
+    def set(self, t):
+        """Sets the time, given as a POSIX timestamp or a naive local datetime."""
+        self.t = t.timestamp() if isinstance(t, datetime.datetime) else float(t)
+
+    def __call__(self):
+        return self.t
+
+class SentienceStateTable:
+    """
+    Table of SentienceState keyed by conversation, created on first access.
+
+    States idle for longer than max_idle seconds are evicted, and so are the least recently
+    used states beyond max_size. Exposed positivity halves within minutes, so an evicted state
+    is indistinguishable from a fresh one by the time it is dropped.
+    """
+
+    def __init__(self, max_idle=3600, max_size=100000):
+        self.max_idle = max_idle
+        self.max_size = max_size
+        self.__states = {} #insertion ordered, kept in order of last access
+
+    def __len__(self):
+        return len(self.__states)
+
+    def get(self, conversation):
+        """Returns the state of the given conversation, creating it if needed."""
+        now = Sentience.getTime()
+        state = self.__states.pop(conversation, None)
+        if state is None:
+            state = SentienceState(Sentience.getStreamSeed(conversation))
+        state.last_access = now
+        self.__states[conversation] = state
+        self.evictIdle(now)
+        return state
+
+    def evictIdle(self, now=None):
+        """Evicts idle states, and the least recently used states beyond max_size."""
+        now = Sentience.getTime() if now is None else now
+        while self.__states:
+            conversation = next(iter(self.__states))
+            state = self.__states[conversation]
+            if len(self.__states) <= self.max_size and now - state.last_access <= self.max_idle:
+                break
+            del self.__states[conversation]
 
 class Sentience:
+    """
+    Mood and decisions of the AI.
+
+    Methods reading or updating the mood accept an optional SentienceState, as returned by
+    getState, to keep conversations apart. Without one, the shared default state is used.
+    """
 
     __IDENTITY = 'tofu'
     @staticmethod
@@ -14,14 +102,107 @@ class Sentience:
         """Returns identity of script, the name it goes by. This should be a single word."""
         return Sentience.__IDENTITY.lower()
 
+    __clock = time.time
     @staticmethod
-    def getPrimaryMood():
+    def setClock(clock=None):
+        """
+        Sets the clock used for mood decay, mood curves and status, as a callable returning a POSIX timestamp.
+        This allows replaying messages at their original times. None restores the wall clock.
+        """
+        Sentience.__clock = time.time if clock is None else clock
+
+    @staticmethod
+    def getTime():
+        """Returns the current POSIX timestamp according to the clock in use."""
+        return Sentience.__clock()
+
+    @staticmethod
+    def getDatetime():
+        """Returns the current local datetime according to the clock in use."""
+        return datetime.datetime.fromtimestamp(Sentience.__clock())
+
+    __default_state = SentienceState()
+    __states = SentienceStateTable()
+    @staticmethod
+    def getState(conversation=None):
+        """
+        Returns the mood state of the given conversation.
+        Without a conversation, the state shared by every message not tied to one is returned.
+        """
+        if conversation is None:
+            return Sentience.__default_state
+        return Sentience.__states.get(conversation)
+
+    @staticmethod
+    def getStateTable():
+        """Returns the table holding the mood state of every conversation."""
+        return Sentience.__states
+
+    __seed = None
+    @staticmethod
+    def setSeed(seed=None):
+        """
+        Sets the seed all random streams derive from, making decisions, status messages and mood stability reproducible.
+        None makes decisions unpredictable again. The default state is reseeded, while existing conversation states keep their streams.
+        """
+        Sentience.__seed = seed
+        Sentience.__stability_day = None
+        Sentience.__default_state.seed = Sentience.getStreamSeed(None)
+        Sentience.__default_state.draws = 0
+
+    @staticmethod
+    def getStreamSeed(stream):
+        """Returns the seed of the named random stream derived from the configured seed, or None if there is none."""
+        if Sentience.__seed is None:
+            return None
+        return '%s:%r' % (Sentience.__seed, stream)
+
+    __unseeded_random = random.Random()
+    @staticmethod
+    def getRandom(state=None):
+        """
+        Returns the random stream the next decision on the given state is drawn from.
+
+        States only keep a seed and a count of decisions rather than a generator of their own, which
+        would take kilobytes per conversation. A seeded state gets a generator seeded from both, so
+        its decisions are reproducible, while unseeded states share a single unpredictable one.
+        """
+        state = state if state is not None else Sentience.getState()
+        if state.seed is None:
+            return Sentience.__unseeded_random
+        state.draws += 1
+        return random.Random('%s#%d' % (state.seed, state.draws))
+
+    @staticmethod
+    def getDailyRandom(day):
+        """Returns a new random stream for the given day number, which is the same for every call on that day."""
+        seed = Sentience.getStreamSeed(('day', day))
+        return random.Random(day if seed is None else seed)
+
+    @staticmethod
+    def getMoodSnapshot(state=None):
+        """Returns an immutable MoodSnapshot of the given state as of the current time."""
+        now = Sentience.getTime()
+        exp_pos = Sentience.getExposedPositivity(state=state)
+        stability = Sentience.getMoodStability()
+        return MoodSnapshot(
+            time=now,
+            primary_mood=Sentience.__computePrimaryMood(datetime.datetime.fromtimestamp(now), exp_pos, stability),
+            mood_stability=stability,
+            exposed_positivity=exp_pos,
+            positivity_overload=(state if state is not None else Sentience.getState()).positivity_overload
+        )
+
+    @staticmethod
+    def getPrimaryMood(state=None):
         """
         Returns primary mood as of the current time.
         Ranges between [-1.0, 1.0], with -1.0 being very sad/annoyed/mad, 0.0 being neutral and 1.0 being very happy
         """
-        now = datetime.datetime.now()
+        return Sentience.getMoodSnapshot(state).primary_mood
 
+    @staticmethod
+    def __computePrimaryMood(now, exp_pos, stability):
         # sin curve, best mood during noon 2pm, worst mood during midnight 2am.
         time_offset = max(0.0, min(((now.hour*60 + now.minute - 120) % 1440)/(1440), 1.0))
         time_moodadj = math.sin(time_offset*math.pi)
@@ -31,32 +212,34 @@ class Sentience:
         date_moodadj = math.cos(date_offset*(12*math.pi))
 
         # recompute exposed positivity as exponential of degree 3, adjustable by how stable the mood is
-        exp_pos = Sentience.getExposedPositivity()
         if exp_pos < 0:
-            exp_pos = (exp_pos**3) * (1-Sentience.getMoodStability())
+            exp_pos = (exp_pos**3) * (1-stability)
         else:
-            exp_pos = exp_pos**3 * Sentience.getMoodStability()
+            exp_pos = exp_pos**3 * stability
 
         mood = 0.3 + date_moodadj*0.2 + time_moodadj*0.5 + exp_pos*0.25
         return max(-1.0, min(mood, 1.0))
 
+    __stability_day = None
+    __stability = None
     @staticmethod
     def getMoodStability():
         """
         Returns stability of mood as of today.
         Output ranges between [0.0, 1.0], with 1.0 indicating most stable.
+
+        The value only changes daily, so it is computed once per day.
         """
-        now = datetime.datetime.now()
-        random.seed(int((now.month-1)*30 + (now.day-1) + 1))
-        ans = random.uniform(0.1,0.6) + random.uniform(0.1,0.4)
-        random.seed(time.time())
-        return ans
-
-    __exposed_positivity = 0.0
-    __last_message_exposure = 0.0
-    __positivity_overload = False
+        now = Sentience.getDatetime()
+        day = int((now.month-1)*30 + (now.day-1) + 1)
+        if day != Sentience.__stability_day:
+            rng = Sentience.getDailyRandom(day)
+            Sentience.__stability = rng.uniform(0.1,0.6) + rng.uniform(0.1,0.4)
+            Sentience.__stability_day = day
+        return Sentience.__stability
+
     @staticmethod
-    def getExposedPositivity(unlimited=False):
+    def getExposedPositivity(unlimited=False, state=None):
         """
         Returns exposed positivity over time from messages.
 
@@ -64,66 +247,74 @@ class Sentience:
 
         Output ranges is capped between [-1.0, 1.0], unless the unlimited argument is set to True.
         """
+        if state is None:
+            state = Sentience.getState()
 
-        if Sentience.__positivity_overload:
-            Sentience.__exposed_positivity = -abs(Sentience.__exposed_positivity)
+        if state.positivity_overload:
+            state.exposed_positivity = -abs(state.exposed_positivity)
 
         #half life factor computation
-        half_life_ctrl = 0.3 if Sentience.__positivity_overload else (0.5 if Sentience.__exposed_positivity < 0 else 1.2)
-        half_life_factor = max(0.0, min(2**(min(0.0, (Sentience.__last_message_exposure - time.time())/60)*half_life_ctrl), 1.0))
+        now = Sentience.getTime()
+        half_life_ctrl = 0.3 if state.positivity_overload else (0.5 if state.exposed_positivity < 0 else 1.2)
+        half_life_factor = max(0.0, min(2**(min(0.0, (state.last_message_exposure - now)/60)*half_life_ctrl), 1.0))
 
         #recompute current exposed positivity
-        Sentience.__exposed_positivity = max(-1.5, min(Sentience.__exposed_positivity, 2.0)) * half_life_factor
-        Sentience.__last_message_exposure = time.time()
+        state.exposed_positivity = max(-1.5, min(state.exposed_positivity, 2.0)) * half_life_factor
+        state.last_message_exposure = now
 
-        if Sentience.__exposed_positivity > -0.5:
-            Sentience.__positivity_overload = False
+        if state.exposed_positivity > -0.5:
+            state.positivity_overload = False
 
-        return Sentience.__exposed_positivity if unlimited else round(max(-1.0, min(Sentience.__exposed_positivity, 1.0)),6)
+        return state.exposed_positivity if unlimited else round(max(-1.0, min(state.exposed_positivity, 1.0)),6)
 
     @staticmethod
-    def isExposedPositivityOverloaded():
+    def isExposedPositivityOverloaded(state=None):
         """
         Returns whether there is too much exposed positivity.
         When this is True, most gained positivity and negativity will have minimal effect on the final exposed positivity.
         """
+        if state is None:
+            state = Sentience.getState()
 
-        Sentience.getExposedPositivity() #preprocess current positivity, which will update whether positivity overload is in effect
+        Sentience.getExposedPositivity(state=state) #preprocess current positivity, which will update whether positivity overload is in effect
 
-        return Sentience.__positivity_overload
+        return state.positivity_overload
 
     @staticmethod
-    def _addExposedPositivity(x):
+    def _addExposedPositivity(x, state=None):
         """
         Updates exposed positivity value.
         """
-        current_pos = Sentience.getExposedPositivity(unlimited=True)
-        if not Sentience.__positivity_overload:
+        if state is None:
+            state = Sentience.getState()
+        current_pos = Sentience.getExposedPositivity(unlimited=True, state=state)
+        if not state.positivity_overload:
             current_pos += x*(0.4*max((1-abs(current_pos))**2, 0.1))
         else:
             current_pos += -abs(max(-0.05, min(x*0.3, 0.001)))
 
-        Sentience.__exposed_positivity = current_pos
-        if Sentience.__exposed_positivity > 0.5 + Sentience.getMoodStability():
-            Sentience.__positivity_overload = True
+        state.exposed_positivity = current_pos
+        if state.exposed_positivity > 0.5 + Sentience.getMoodStability():
+            state.positivity_overload = True
 
     @staticmethod
-    def exposeToMessage(message):
+    def exposeToMessage(message, state=None):
         """
         Exposes to the given message and updates the exposed positivity value.
         """
         x = Sentience.determineMessagePositivity(message)
         if x is None:
-            random.seed(time.time())
-            x = random.uniform(-1.0,1.0)
-        Sentience._addExposedPositivity(x)
+            x = Sentience.getRandom(state).uniform(-1.0,1.0)
+        Sentience._addExposedPositivity(x, state)
 
 
-    __DEF_PROB_THRESHOLD = 0.02
+    __DEF_PROB_THRESHOLD = None
     @staticmethod
     def _cleanupPositivityValue(v):
         if v is None:
             return None
+        if Sentience.__DEF_PROB_THRESHOLD is None:
+            Sentience.preloadPositivityClassifier()
         if abs(v) <= abs(Sentience.__DEF_PROB_THRESHOLD) + 0.00001:
             return 0
         return v
@@ -134,7 +325,7 @@ class Sentience:
             if not isinstance(message, tuple):
                 message = Understanding.parse_sentence_subject_predicate(message)
 
-            subject, predicate = tuple(map(lambda x: ' '.join(map(lambda y: y[0], x)), message))
+            subject, predicate = message
             res_subj = Sentience._cleanupPositivityValue(getSentencePositivity(subject))
             res_pred = Sentience._cleanupPositivityValue(getSentencePositivity(predicate))
 
@@ -148,7 +339,10 @@ class Sentience:
             #subject is negative, agree if predicate is negative
             return res_pred * -1
 
-        if not isinstance(message, str) or not message.strip():
+        if isinstance(message, AnalyzedMessage):
+            if not message.text.strip():
+                return 0.0
+        elif not isinstance(message, str) or not message.strip():
             return 0.0
 
         res = getSentencePositivity(message)
@@ -161,8 +355,8 @@ class Sentience:
 
         For example, "I'm really happy" yields positive.
 
-        The parameter accepts a message in a string format or a message tokenized
-        and split into subject-predicate form with Understanding.
+        The parameter accepts a message in a string format, an AnalyzedMessage or
+        a message tokenized and split into subject-predicate form with Understanding.
 
         Output ranges between [-1.0, 1.0], with -1.0 being most negative and 1.0
         being most positive.
@@ -175,8 +369,8 @@ class Sentience:
         Returns validity of the message based of whether the sentiment in it
         is contradictory.
 
-        The parameter accepts a message in a string format or a message tokenized
-        and split into subject-predicate form with Understanding.
+        The parameter accepts a message in a string format, an AnalyzedMessage or
+        a message tokenized and split into subject-predicate form with Understanding.
 
         Unlike determineMessagePositivity, this checks whether the positivity of
         parts of the sentence itself agrees with each other. For example,
@@ -195,95 +389,105 @@ class Sentience:
         Sentience.__DEF_PROB_THRESHOLD = getSentencePositivity("!@#$%^&*")
 
     @staticmethod
-    def determineResponseAgreeability(message, updateExposedPositivity=False):
+    def determineResponseAgreeability(message, updateExposedPositivity=False, state=None, snapshot=None, wholeMessageOnly=False):
         """
         Returns how much to 'agree' with a message received with the given message.
-        The parameter accepts a message in a string format or tokenized and split into subject-predicate form with Understanding.
+        The parameter accepts a message in a string format, an AnalyzedMessage or tokenized and split into subject-predicate form with Understanding.
 
         Also updates exposed positivity if updateExposedPositivity is set to True.
+        The mood is read from the given MoodSnapshot, or taken anew if there is none or the mood was updated.
+
+        If wholeMessageOnly is set to True, the subject-predicate validity analysis is skipped, and the
+        positivity of the whole message stands in for its validity, which is much cheaper.
 
         Output ranges are between [-1.0, 1.0]
         """
 
+        rng = Sentience.getRandom(state)
         message_positivity = Sentience.determineMessagePositivity(message)
-        message_validity = Sentience.determineMessageValidity(message)
+        if wholeMessageOnly:
+            message_validity = message_positivity
+        else:
+            message_validity = Sentience.determineMessageValidity(message)
         if message_validity is None:
-            random.seed(time.time())
-            message_validity = random.uniform(-1.0,1.0)
+            message_validity = rng.uniform(-1.0,1.0)
             message_positivity = message_validity
 
         if updateExposedPositivity:
-            Sentience._addExposedPositivity(message_positivity)
+            Sentience._addExposedPositivity(message_positivity, state)
+            snapshot = None
+        if snapshot is None:
+            snapshot = Sentience.getMoodSnapshot(state)
 
-        #compute random deviation from current time
-        random.seed(time.time())
-        deviation = random.uniform(-0.5,0.5) * (1-Sentience.getMoodStability())
+        #compute random deviation
+        deviation = rng.uniform(-0.5,0.5) * (1-snapshot.mood_stability)
 
-        tofu_mood = Sentience.getPrimaryMood()
+        tofu_mood = snapshot.primary_mood
 
         #return result
         result = max(-1.0, min(
-            (tofu_mood + Sentience.getExposedPositivity()*0.25 + deviation)*(message_validity),
+            (tofu_mood + snapshot.exposed_positivity*0.25 + deviation)*(message_validity),
         1.0))
         return result
 
     @staticmethod
-    def decideResponseAgree(message):
+    def decideResponseAgree(message, state=None, snapshot=None, wholeMessageOnly=False):
         """
         Decides whether a response would agree with the message.
         Returns True if agree, False if disagree, None if indecisive.
         """
-        agreeability = Sentience.determineResponseAgreeability(message)
+        agreeability = Sentience.determineResponseAgreeability(message, state=state, snapshot=snapshot, wholeMessageOnly=wholeMessageOnly)
         if agreeability > 0.3:
             return True
         if agreeability < -0.3:
             return False
 
-        random.seed(time.time())
+        rng = Sentience.getRandom(state)
         factor  = 1-(abs(agreeability))/0.3
-        rnd_tri = random.uniform(0.0, factor) + random.uniform(0.0, factor)
+        rnd_tri = rng.uniform(0.0, factor) + rng.uniform(0.0, factor)
         if rnd_tri > 0.7:
             return None
         if agreeability > 0.1:
             return True
         if agreeability < -0.1:
             return False
-        return random.choice([True, False])
+        return rng.choice([True, False])
 
     @staticmethod
-    def decideResponseOptionsIndex(subject, options):
+    def decideResponseOptionsIndex(subject, options, state=None, snapshot=None):
         """
         Decides to choose an option from the given options for a specified subject.
         Returns the index, which may be None if indecisive.
+
+        Options may be None, e.g. when there is no time left to analyze them, with the subject being
+        the whole message instead. Their order then stands in for their positivity, so a positive
+        message leans towards the first option and a negative one towards the last.
+        If no classifier exists, an index is picked at random.
         """
-        subj_pos = Sentience._cleanupPositivityValue(
-            getSentencePositivity(Understanding.unparse_sentence(subject))
-        )
+        rng = Sentience.getRandom(state)
+        stability = snapshot.mood_stability if snapshot is not None else Sentience.getMoodStability()
+        subj_pos = Sentience._cleanupPositivityValue(getSentencePositivity(subject)) if subject is not None else None
         if subj_pos is None:
-            return random.randint(0,len(options))
+            return rng.randrange(len(options))
         opts_pos = []
         for i, option in enumerate(options):
-            opts_pos.append(
-                (
-                    i,
-                    Sentience._cleanupPositivityValue(
-                        getSentencePositivity(Understanding.unparse_sentence(option))
-                    )
-                )
-            )
-
-        random.seed(time.time())
-        random.shuffle(opts_pos)
-        deviation = random.uniform(-0.5,0.5) * (1-Sentience.getMoodStability())
+            if option is None:
+                pos = 1.0 - 2.0*i/(len(options)-1) if len(options) > 1 else 0.0
+            else:
+                pos = Sentience._cleanupPositivityValue(getSentencePositivity(option))
+            opts_pos.append((i, pos))
+
+        rng.shuffle(opts_pos)
+        deviation = rng.uniform(-0.5,0.5) * (1-stability)
 
         if subj_pos > -0.15:
             #subject is neutral or positive, look for positive answer
-            roll = random.uniform(-0.2 + deviation, 1.0)
+            roll = rng.uniform(-0.2 + deviation, 1.0)
         else:
             #subject is negative, look for negative response
-            roll = random.uniform(-1.0 , 0.2 + deviation)
+            roll = rng.uniform(-1.0 , 0.2 + deviation)
 
-        if abs(roll) < (1-Sentience.getMoodStability())*0.3:
+        if abs(roll) < (1-stability)*0.3:
             return None
 
         opti, _ = min(map(lambda x: (x[0], abs(roll-x[1])), opts_pos), key=lambda x: x[1])
@@ -292,20 +496,21 @@ class Sentience:
 
 
     @staticmethod
-    def getStatusMessage():
-        """Returns a status message as of right now, based on current conditions."""
+    def getStatusMessage(state=None, snapshot=None):
+        """Returns a status message as of right now, or as of the given MoodSnapshot, based on current conditions."""
+        if snapshot is None:
+            snapshot = Sentience.getMoodSnapshot(state)
 
-        now = datetime.datetime.now()
-        hour = now.hour
-        mood = Sentience.getPrimaryMood()
-        exp_mood = Sentience.getExposedPositivity()
+        hour = snapshot.datetime.hour
+        mood = snapshot.primary_mood
+        exp_mood = snapshot.exposed_positivity
 
-        random.seed((time.time()//86400*86400))
+        rng = Sentience.getDailyRandom(int(snapshot.time//86400))
 
         #sleeping
         if not (9 <= hour < 21) and (mood <= 0.5 or not 7 <= hour < 23):
             if exp_mood < -0.1:
-                return random.choice([
+                return rng.choice([
                     "bleh",
                     "not sleeping well",
                     "why's chat so noisy",
@@ -314,7 +519,7 @@ class Sentience:
                 ])
 
             if mood < 0:
-                return random.choice([
+                return rng.choice([
                     "crying myself to sleep rn",
                     ":(",
                     "had a nightmare",
@@ -322,7 +527,7 @@ class Sentience:
                     "._."
                 ])
 
-            return random.choice([
+            return rng.choice([
                 "zzz...",
                 "sweet dreams",
                 "good night",
@@ -330,8 +535,8 @@ class Sentience:
                 "having some rest"
             ])
 
-        if Sentience.isExposedPositivityOverloaded():
-            return random.choice([
+        if snapshot.positivity_overload:
+            return rng.choice([
                 "i'm done",
                 "too much"
                 "goodbye",
@@ -341,7 +546,7 @@ class Sentience:
 
         #happy
         if mood >= 0.7:
-            return random.choice([
+            return rng.choice([
                 ":D",
                 "great day",
                 "happy happy",
@@ -354,7 +559,7 @@ class Sentience:
             ])
         #moody-ish
         if mood >= 0.4:
-            return random.choice([
+            return rng.choice([
                 "hmm",
                 "yeet",
                 "bleh",
@@ -364,7 +569,7 @@ class Sentience:
             ])
         #more moody
         if mood >= -0.3:
-            return random.choice([
+            return rng.choice([
                 "moody rn",
                 "not happy",
                 "i'm fine.",
@@ -373,7 +578,7 @@ class Sentience:
                 ":(",
             ])
         #very unhappy
-        return random.choice([
+        return rng.choice([
             "sad",
             "cries",
             "roar",
@@ -389,39 +594,47 @@ class Sentience:
 
 
     @staticmethod
-    def getDebugInfo():
+    def getDebugInfo(state=None, snapshot=None):
+        if snapshot is None:
+            snapshot = Sentience.getMoodSnapshot(state)
         return "Status Message          : %s;\nCurrent Mood Positivity : %6.1f%%;\nMood Stability          : %6.1f%%;\nExposed Positivity      : %6.1f%%%s;" % \
-            (Sentience.getStatusMessage(), Sentience.getPrimaryMood()*100, Sentience.getMoodStability()*100, Sentience.getExposedPositivity()*100, " (positivity overload)" if Sentience.isExposedPositivityOverloaded() else "")
+            (Sentience.getStatusMessage(snapshot=snapshot), snapshot.primary_mood*100, snapshot.mood_stability*100, snapshot.exposed_positivity*100, " (positivity overload)" if snapshot.positivity_overload else "")
 
     @staticmethod
-    def getDebugInfoDict():
+    def getDebugInfoDict(state=None, snapshot=None):
+        if snapshot is None:
+            snapshot = Sentience.getMoodSnapshot(state)
         return {
-            "statusMessage"     : Sentience.getStatusMessage(),
-            "primaryMood"       : Sentience.getPrimaryMood(),
-            "moodStability"     : Sentience.getMoodStability(),
-            "exposedPositivity" : Sentience.getExposedPositivity(),
-            "positivityOverload": Sentience.isExposedPositivityOverloaded()
+            "statusMessage"     : Sentience.getStatusMessage(snapshot=snapshot),
+            "primaryMood"       : snapshot.primary_mood,
+            "moodStability"     : snapshot.mood_stability,
+            "exposedPositivity" : snapshot.exposed_positivity,
+            "positivityOverload": snapshot.positivity_overload
         }
 
     @staticmethod
-    def getDebugInfoAfterMessage(message):
+    def getDebugInfoAfterMessage(message, state=None):
         if not message:
             return "%s\nOrigin Msg Positivity   : N/A;\nAgrees w/ Origin        : N/A;" % \
-                (Sentience.getDebugInfo())
+                (Sentience.getDebugInfo(state))
+
+        if isinstance(message, str):
+            message = AnalyzedMessage(message)
 
+        snapshot  = Sentience.getMoodSnapshot(state)
         ori_pos   = Sentience.determineMessagePositivity(message)
         ori_valid = Sentience.determineMessageValidity(message)
-        res_agree = Sentience.determineResponseAgreeability(message)
+        res_agree = Sentience.determineResponseAgreeability(message, state=state, snapshot=snapshot)
 
         if ori_pos is None:
             return "%s\nERROR_CLASSIFIER_MISSING;\nAgrees w/ Origin        : %6.1f%%;" % \
-                (Sentience.getDebugInfo(), res_agree*100)
+                (Sentience.getDebugInfo(snapshot=snapshot), res_agree*100)
         else:
             return "%s\nOrigin Msg Positivity   : %6.1f%%;\nOrigin Msg Validity     : %6.1f%%;\nAgrees w/ Origin        : %6.1f%%;" % \
-                (Sentience.getDebugInfo(), ori_pos*100, ori_valid*100, res_agree*100)
+                (Sentience.getDebugInfo(snapshot=snapshot), ori_pos*100, ori_valid*100, res_agree*100)
 
-#preloading
-Sentience.preloadPositivityClassifier()
+#seed of every random stream, for reproducible runs
+Sentience.setSeed(os.environ.get('TOFU_SEED') or None)
 
 #direct script execution
 if __name__ == "__main__" :
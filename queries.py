@@ -1,9 +1,35 @@
-import copy
-from nltk.tag import pos_tag
-from nltk.tokenize.casual import casual_tokenize
+from array import array
+
+from analysis import AnalyzedMessage
+from cache import LRUCache
 
 IDENTITY = None
 
+LEXICON_CACHE = LRUCache('lexicon')
+
+#penn treebank tags, interned to small integers so tag families and signatures are bitmasks
+#id 0 stands for any tag not listed here, which belongs to no family
+TAGS = (
+    None, 'CC', 'CD', 'DT', 'EX', 'FW', 'IN', 'JJ', 'JJR', 'JJS', 'LS', 'MD', 'NN', 'NNS', 'NNP', 'NNPS',
+    'PDT', 'POS', 'PRP', 'PRP$', 'RB', 'RBR', 'RBS', 'RP', 'SYM', 'TO', 'UH', 'VB', 'VBD', 'VBG', 'VBN',
+    'VBP', 'VBZ', 'WDT', 'WP', 'WP$', 'WRB', '.', ',', ':', '$', '#', '``', "''", '(', ')', '-LRB-', '-RRB-'
+)
+TAG_IDS = {tag: i for i, tag in enumerate(TAGS) if tag is not None}
+
+def tag_id(tag):
+    '''Returns the integer id of a tag, 0 if it is not a known tag.'''
+    return TAG_IDS.get(tag, 0)
+
+def tag_ids(toktags):
+    '''Returns the tag ids of a (token, tag) list as a compact array.'''
+    return array('B', [TAG_IDS.get(tag, 0) for _, tag in toktags])
+
+def __tag_mask(tags):
+    mask = 0
+    for tag in tags:
+        mask |= 1 << TAG_IDS[tag]
+    return mask
+
 #common loosely defined tag sets
 __NOUN_SET       = {'DT', 'JJ', 'NN', 'NNS', 'NNP', 'NNPS'}
 __PRONOUN_SET    = {'PRP', 'PRP$'}
@@ -20,32 +46,34 @@ __TAG_SET_TYPES = ['NOUN', 'PRONOUN', 'VERB', 'ADVERB', 'ADJECTIVE', 'PARTICLE',
 def get_tag_set_types():
     return __TAG_SET_TYPES
 
+#bit of each tag set, and the tag sets of each tag id as a bitmask of those bits
+FAMILY_BITS = {name: 1 << i for i, name in enumerate(__TAG_SET_TYPES)}
+TAG_FAMILIES = [0] * len(TAGS)
+for __name, __tag_set in zip(__TAG_SET_TYPES, [__NOUN_SET, __PRONOUN_SET, __VERB_SET, __ADVERB_SET, __ADJECTIVE_SET,
+                                               __PARTICLE_SET, __DETERMINER_SET, __CONNECTOR_SET, __TERMINATE_SET, __WH_QN_SET]):
+    for __tag in __tag_set:
+        TAG_FAMILIES[TAG_IDS[__tag]] |= FAMILY_BITS[__name]
+del __name, __tag_set, __tag
+
+__family_masks = {}
+def family_mask(st):
+    '''Returns the bitmask of a tag set name, or of a list of them. Unknown names have no bits.'''
+    key = tuple(st) if isinstance(st, list) else st
+    mask = __family_masks.get(key)
+    if mask is None:
+        mask = 0
+        for name in (key if isinstance(key, tuple) else (key,)):
+            mask |= FAMILY_BITS.get(name, 0)
+        __family_masks[key] = mask
+    return mask
+
 def tag_in_set(tag, st):
     '''
     Returns True if a tag exists in a tag set, False otherwise.
     Valid set terms: NOUN, VERB, ADVERB, CONNECTOR, TERMINATE, WH-
+    A list of set terms may be given to check whether the tag exists in any of them.
     '''
-
-    TAG_SET_MAP = {
-        'NOUN': __NOUN_SET,
-        'PRONOUN': __PRONOUN_SET,
-        'VERB': __VERB_SET,
-        'ADVERB': __ADVERB_SET,
-        'ADJECTIVE': __ADJECTIVE_SET,
-        'PARTICLE': __PARTICLE_SET,
-        'DETERMINER': __DETERMINER_SET,
-        'CONNECTOR': __CONNECTOR_SET,
-        'TERMINATE': __TERMINATE_SET,
-        'WH-': __WH_QN_SET
-    }
-
-    if isinstance(st, list):
-        for _st in st:
-            if tag_in_set(tag, _st):
-                return True
-        return False
-    res = (tag in TAG_SET_MAP[st]) if (st in TAG_SET_MAP) else False
-    return res
+    return (TAG_FAMILIES[TAG_IDS.get(tag, 0)] & family_mask(st)) != 0
 
 #sentence structures to note ("sentence signatures")
 __YN_QN_SETLIST  = [
@@ -61,24 +89,39 @@ __QUERY_TYPES = ['YN_QN', 'STD_QN']
 def get_query_types():
     return __QUERY_TYPES
 
-def simple_sentence_is_type(toktags, typ):
-    SENTENCE_TYPE_MAP = {
-        'YN_QN': __YN_QN_SETLIST,
-        'STD_QN': __STD_QN_SETLIST
-    }
-    if typ not in SENTENCE_TYPE_MAP or toktags == []:
+#signatures compiled into one bitmask of accepted tag ids per leading token, tried in order
+SIGNATURE_TABLE = [
+    ('YN_QN', tuple(map(__tag_mask, __YN_QN_SETLIST))),
+    ('STD_QN', tuple(map(__tag_mask, __STD_QN_SETLIST)))
+]
+__SIGNATURES = dict(SIGNATURE_TABLE)
+__SIGNATURE_LENGTH = max(len(masks) for _, masks in SIGNATURE_TABLE)
+
+def __matches_signature(ids, masks):
+    if len(ids) < len(masks):
         return False
+    for i, mask in enumerate(masks):
+        if not (mask >> ids[i]) & 1:
+            return False
+    return True
 
-    setlist = SENTENCE_TYPE_MAP[typ]
+def classify_sentence(toktags, ids=None):
+    '''
+    Returns the first query type whose signature the (token, tag) list matches, or None.
+    Precomputed tag ids of the list may be given.
+    '''
+    if ids is None:
+        ids = [TAG_IDS.get(tag, 0) for _, tag in toktags[:__SIGNATURE_LENGTH]]
+    for typ, masks in SIGNATURE_TABLE:
+        if __matches_signature(ids, masks):
+            return typ
+    return None
 
-    c = 0
-    for i, toktag in enumerate(toktags):
-        if i >= len(setlist):
-            break
-        if toktag[1] not in setlist[i]:
-            return False
-        c += 1
-    return c == len(setlist)
+def simple_sentence_is_type(toktags, typ):
+    masks = __SIGNATURES.get(typ)
+    if masks is None or toktags == []:
+        return False
+    return __matches_signature([TAG_IDS.get(tag, 0) for _, tag in toktags[:len(masks)]], masks)
 
 # ----------- #
 class Understanding:
@@ -95,69 +138,81 @@ class Understanding:
         }
 
         Returns a list of the above if more than one sentence provided (unless single_sentence_only is True, then returns the last sentence instead).
+
+        Accepts a string, a (token, tag) list or an AnalyzedMessage, the latter reusing its tagging.
         '''
 
         subject_call_tokens, content_tokens, target_summoned = Understanding.parse_subject_message_target(s)
 
         sentences = Understanding.parse_and_split_message(content_tokens)
-        if len(sentences) > 1:
-            #perform recursive computation
-            if single_sentence_only:
-                sentences = [sentences[-1]]
-            else:
-                results = []
-                sentences[0].insert(0, subject_call_tokens)
-                for sentence_portion in sentences:
-                    sentence = []
-                    for portion in sentence_portion:
-                        sentence += portion
-                    s = Understanding.parse_queries(sentence)
-                    if s is not None:
-                        results.append(s)
-
-                if not merge_results:
-                    return results
-
-                queries = []
-                statements = []
-                for result in results:
-                    queries.extend(result["queries"])
-                    statements.extend(result["statements"])
-
-                merged_results = {
-                    "queries": queries,
-                    "statements": statements,
-                    "subject_call": results[0]["subject_call"],
-                    "target_summoned": results[0]["target_summoned"]
-                }
-                return merged_results
+        if len(sentences) > 1 and single_sentence_only:
+            sentences = [sentences[-1]]
+
+        if len(sentences) <= 1:
+            queries, statements = Understanding.__classify_portions(sentences[0] if sentences else [])
+            return {
+                "queries": queries,
+                "statements": statements,
+                "subject_call": subject_call_tokens,
+                "target_summoned": target_summoned
+            }
+
+        #each sentence is parsed as if it were sent alone, with the subject call leading the first one
+        results = []
+        for i, sentence_portions in enumerate(sentences):
+            sentence = [toktag for portion in sentence_portions for toktag in portion]
+            if i == 0 and subject_call_tokens is not None:
+                sentence = subject_call_tokens + sentence
+
+            sentence_call_tokens, sentence_tokens, sentence_target_summoned = Understanding.parse_subject_message_target(sentence)
+            #a sentence ends at its only terminator, so its content never splits into more sentences
+            sentence_split = Understanding.parse_and_split_message(sentence_tokens)
+            queries, statements = Understanding.__classify_portions(sentence_split[0] if sentence_split else [])
+            results.append({
+                "queries": queries,
+                "statements": statements,
+                "subject_call": sentence_call_tokens,
+                "target_summoned": sentence_target_summoned
+            })
+
+        if not merge_results:
+            return results
+
+        queries = []
+        statements = []
+        for result in results:
+            queries.extend(result["queries"])
+            statements.extend(result["statements"])
 
+        return {
+            "queries": queries,
+            "statements": statements,
+            "subject_call": results[0]["subject_call"],
+            "target_summoned": results[0]["target_summoned"]
+        }
 
+    @staticmethod
+    def __classify_portions(sentence_portions):
+        #returns the queries and statements in the portions of a single sentence
         queries = []
         statements = []
 
         first_portion_ynqn = False
-        sentence_portions = sentences[0] if sentences else []
         for i, portion in enumerate(sentence_portions):
-            selected_query_type = None
-            for query_type in get_query_types():
-                if simple_sentence_is_type(portion, query_type):
-                    queries.append((portion, query_type))
-                    selected_query_type = query_type
-                    break
-
-            if not selected_query_type and len(portion) >= 2:
-                for query_type in get_query_types():
-                    if portion[1][1] == 'VB':
-                        #in some cases the detection is incorrectly a verb.
-                        #so we might want to see if it can be interpreted as a noun or other valid term.
-                        portion_alt = copy.deepcopy((portion))
-                        portion_alt[1] = (portion_alt[1][0], Understanding.parse_sentence(portion_alt[1][0])[0][1])
-
-                        if simple_sentence_is_type(portion_alt, query_type):
-                            queries.append((portion_alt, query_type))
-                            selected_query_type = query_type
-                            break
+            selected_query_type = classify_sentence(portion)
+            if selected_query_type:
+                queries.append((portion, selected_query_type))
+
+            if not selected_query_type and len(portion) >= 2 and portion[1][1] == 'VB':
+                #in some cases the detection is incorrectly a verb.
+                #so we might want to see if it can be interpreted as a noun or other valid term.
+                #tuples are immutable, so a shallow copy is enough to leave the original portion intact
+                portion_alt = list(portion)
+                portion_alt[1] = (portion_alt[1][0], Understanding.get_word_tag(portion_alt[1][0]))
+
+                selected_query_type = classify_sentence(portion_alt)
+                if selected_query_type:
+                    queries.append((portion_alt, selected_query_type))
 
             # heuristics for yn question parsing
             # the ideal way would be to do more parsing
@@ -172,12 +227,19 @@ class Understanding:
             if not selected_query_type:
                 statements.append((portion, 'SM'))
 
-        return {
-            "queries": queries,
-            "statements": statements,
-            "subject_call": subject_call_tokens,
-            "target_summoned": target_summoned
-        }
+        return queries, statements
+
+    @staticmethod
+    def get_word_tag(word):
+        '''
+        Returns the tag a word gets when tagged on its own, as parse_sentence would give it.
+        Tags are memoized per word in the lexicon cache, so each distinct word is tagged at most once.
+        '''
+        tag = LEXICON_CACHE.get(word)
+        if tag is None:
+            tag = Understanding.parse_sentence(word)[0][1]
+            LEXICON_CACHE.put(word, tag)
+        return tag
 
     @staticmethod
     def parse_sentence_subject_predicate(s):
@@ -216,6 +278,8 @@ class Understanding:
             import positivity
             IDENTITY = positivity.Sentience.getIdentity()
 
+        if isinstance(s, AnalyzedMessage):
+            s = s.text
         return ('@' + IDENTITY.lower()) in s.lower()
 
     @staticmethod
@@ -241,19 +305,13 @@ class Understanding:
         Returns the tagged and tokenized sentence in the form of a (token, tag) list.
 
         If a (token, tag) list is given, it returns itself. This allows for redundant calls to make sure the sentence is tokenized.
+        If an AnalyzedMessage is given, its already computed tagging is returned.
         '''
         if isinstance(s, list):
             return s
-
-        global IDENTITY
-        if IDENTITY is None:
-            import positivity
-            IDENTITY = positivity.Sentience.getIdentity()
-
-        s = s.replace('@' + IDENTITY, IDENTITY)
-        tokens = list(map(lambda x: 'I' if x == 'i' else x, casual_tokenize(s,reduce_len=True)))
-        tagged_tokens = list(map(lambda x: (x[0], 'NN') if Understanding.matches_target(x[0]) else x, pos_tag(tokens)))
-        return tagged_tokens
+        if not isinstance(s, AnalyzedMessage):
+            s = AnalyzedMessage(s)
+        return s.toktags
 
     @staticmethod
     def unparse_sentence(tt):
@@ -275,10 +333,14 @@ class Understanding:
         Returns parsed data split into sentences and sentence parts. This will return a 3D list of (token, tag).
         '''
         tokens = Understanding.parse_sentence(s)
+        ids = s.tag_ids if isinstance(s, AnalyzedMessage) else tag_ids(tokens)
+        terminate = FAMILY_BITS['TERMINATE']
+        connector = FAMILY_BITS['CONNECTOR']
+
         sentences = [[]]
-        for toktag in tokens:
-            sentences[-1].append(toktag)
-            if tag_in_set(toktag[1], 'TERMINATE'):
+        for toktag, tid in zip(tokens, ids):
+            sentences[-1].append((toktag, tid))
+            if TAG_FAMILIES[tid] & terminate:
                 sentences.append([])
 
         while sentences != [] and sentences[-1] == []:
@@ -287,9 +349,9 @@ class Understanding:
         for i, sent in enumerate(sentences):
             split_sent = [[]]
 
-            for toktag in sent:
+            for toktag, tid in sent:
                 split_sent[-1].append(toktag)
-                if toktag[0] != 'and' and tag_in_set(toktag[1], 'CONNECTOR'):
+                if TAG_FAMILIES[tid] & connector and toktag[0] != 'and':
                     split_sent.append([])
 
             while split_sent != [] and split_sent[-1] == []:
@@ -318,19 +380,22 @@ class Understanding:
             return s
 
         tokens = Understanding.parse_sentence(s)
+        ids = s.tag_ids if isinstance(s, AnalyzedMessage) else tag_ids(tokens)
+        noun = FAMILY_BITS['NOUN']
+        connector = FAMILY_BITS['CONNECTOR']
 
         target_summoned = False
 
         index_after_target = 0
-        for i, tok_tag in enumerate(tokens):
+        for i, (tok_tag, tid) in enumerate(zip(tokens, ids)):
             tok, tag = tok_tag
 
-            if (i == index_after_target) and tag_in_set(tag, 'NOUN'):
+            if (i == index_after_target) and TAG_FAMILIES[tid] & noun:
                 index_after_target += 1
                 if Understanding.matches_target(tok):
                     target_summoned = True
                 continue
-            if tag_in_set(tag, 'CONNECTOR'):
+            if TAG_FAMILIES[tid] & connector:
                 index_after_target += 1
                 continue
             if i != index_after_target:
@@ -1,147 +1,224 @@
 # Reference Implementation: https://www.digitalocean.com/community/tutorials/how-to-perform-sentiment-analysis-in-python-3-using-the-natural-language-toolkit-nltk
 
-from nltk.stem.wordnet import WordNetLemmatizer
-from nltk.corpus import twitter_samples, stopwords
-from nltk.tag import pos_tag
-from nltk.tokenize import word_tokenize
-from nltk.tokenize.casual import casual_tokenize
-from nltk import FreqDist, classify, NaiveBayesClassifier
-import re, string, random
+# NLTK and the classifier are loaded on first use, so importing this module stays cheap.
+import re, string
 import pickle
 import os
 
-stop_words = stopwords.words('english')
+from analysis import AnalyzedMessage
+from cache import LRUCache
 
-def saveClassifier(classifier):
-    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'sentiment_classifier.pickle')
+SENTIMENT_CACHE = LRUCache('sentiment')
+LEMMA_CACHE = LRUCache('lemmas')
+
+__stop_words = None
+def getStopWords():
+    """Returns the english stopwords list, loading the corpus on first use."""
+    global __stop_words
+    if __stop_words is None:
+        from nltk.corpus import stopwords
+        __stop_words = stopwords.words('english')
+    return __stop_words
+
+class Normalizer:
+    """
+    Turns tagged (token, tag) lists into the cleaned, lemmatized tokens fed to the classifier.
+
+    Patterns are compiled once, stopwords are kept in a frozenset, and lemmas are memoized per
+    (token, pos) in LEMMA_CACHE, so WordNet is only consulted once per distinct word.
+    """
+
+    __URL_PATTERN = re.compile('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+#]|[!*\(\),]|'\
+                               '(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+    __MENTION_PATTERN = re.compile("(@[A-Za-z0-9_]+)")
+    __lemmatizer = None
+
+    def __init__(self, stop_words=()):
+        self.stop_words = frozenset(stop_words)
+
+    @staticmethod
+    def lemmatize(token, pos):
+        """Returns the WordNet lemma of token as the given part of speech ('n', 'v' or 'a')."""
+        key = (token, pos)
+        lemma = LEMMA_CACHE.get(key)
+        if lemma is None:
+            if Normalizer.__lemmatizer is None:
+                from nltk.stem.wordnet import WordNetLemmatizer
+                Normalizer.__lemmatizer = WordNetLemmatizer()
+            lemma = Normalizer.__lemmatizer.lemmatize(token, pos)
+            LEMMA_CACHE.put(key, lemma)
+        return lemma
+
+    def normalize(self, tagged_tokens):
+        """Returns the cleaned and lemmatized tokens of a tagged (token, tag) list, without stopwords."""
+        stop_words = self.stop_words
+        cleaned_tokens = []
+
+        for token, tag in tagged_tokens:
+            #the patterns cannot match without these, and most tokens have neither
+            if 'http' in token:
+                token = Normalizer.__URL_PATTERN.sub('', token)
+            if '@' in token:
+                token = Normalizer.__MENTION_PATTERN.sub('', token)
+
+            if tag.startswith("NN"):
+                pos = 'n'
+            elif tag.startswith('VB'):
+                pos = 'v'
+            else:
+                pos = 'a'
+
+            token = Normalizer.lemmatize(token, pos)
+
+            if len(token) > 0 and token not in string.punctuation:
+                token = token.lower()
+                if token not in stop_words:
+                    cleaned_tokens.append(token)
+        return cleaned_tokens
+
+#features at runtime are not stripped of stopwords, as with the classifier in use
+__normalizer = Normalizer()
+
+def __getPath(fname):
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), fname)
+
+def getClassifierPath():
+    """Returns the path of the pickled NLTK classifier."""
+    return __getPath('sentiment_classifier.pickle')
+
+def getCompiledClassifierPath(path=None):
+    """Returns the path of the compiled classifier exported next to the given pickle, or next to the default one."""
+    return os.path.splitext(getClassifierPath() if path is None else path)[0] + '.model'
+
+def saveClassifier(classifier, path=None):
+    """Pickles the given NLTK classifier, by default where it is loaded from, and exports its compiled form next to it."""
+    if path is None:
+        path = getClassifierPath()
     f = open(path, 'wb')
     pickle.dump(classifier, f)
     f.close()
+    exportCompiledClassifier(classifier, getCompiledClassifierPath(path))
 
-def loadClassifier():
-    global __classifier
-    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'sentiment_classifier.pickle')
+def exportCompiledClassifier(classifier, path=None):
+    """
+    Compiles the given NLTK classifier into a vectorized scorer and saves it, by default next to the pickle.
+    Returns the compiled classifier, or None if NumPy is not available.
+    """
+    import naivebayes
+    if not naivebayes.is_available():
+        return None
+    compiled = naivebayes.CompiledNaiveBayes.from_nltk(classifier)
+    compiled.save(getCompiledClassifierPath() if path is None else path)
+    return compiled
+
+__classifier = None
+__classifier_loaded = False
+def loadClassifier(compiled=True):
+    """
+    Loads the sentiment classifier, preferring the compiled scorer.
+    The pickled NLTK classifier is only loaded if the compiled form is missing, or if compiled is False.
+    """
+    global __classifier, __classifier_loaded
+    __classifier_loaded = True
+    if compiled:
+        import naivebayes
+        if naivebayes.is_available():
+            try:
+                __classifier = naivebayes.CompiledNaiveBayes.load(getCompiledClassifierPath())
+                return
+            except:
+                pass
     try:
-        f = open(path, 'rb')
+        f = open(getClassifierPath(), 'rb')
         __classifier = pickle.load(f)
         f.close()
     except:
         __classifier = None
 
-loadClassifier()
+def preload():
+    """Loads the classifier, stopwords and lemmatizer data ahead of their first use."""
+    __getClassifier()
+    getStopWords()
+    Normalizer.lemmatize('tofu', 'n')
 
 def __getClassifier():
+    if not __classifier_loaded:
+        loadClassifier()
     return __classifier
 
+def __probPositiveBatch(classifier, features_list):
+    from naivebayes import CompiledNaiveBayes
+    if isinstance(classifier, CompiledNaiveBayes):
+        if len(features_list) == 1:
+            return [classifier.prob(features_list[0], 'Positive')]
+        return classifier.prob_batch(features_list, 'Positive')
+    return [classifier.prob_classify(dict([token, True] for token in features)).prob('Positive') for features in features_list]
+
 def getSentencePositivity(sentence):
     """
     Returns positivity of the given sentence from -1.0 (very negative) to 1.0 (very positive).
+    The sentence may be a string, a list of (token, tag) or an AnalyzedMessage.
     May return None if no classifier exists to perform sentiment analysis.
     """
-    classifier = __getClassifier()
-    if classifier is None:
-        return None
+    if isinstance(sentence, AnalyzedMessage):
+        return sentence.positivity
 
-    #prepare for classifier
-    tokenized = list(map(lambda x: 'I' if x == 'i' else x, casual_tokenize(sentence)))
-    custom_tokens = __remove_noise(tokenized)
+    if isinstance(sentence, list):
+        return getTaggedPositivity(sentence)
 
-    #classify and get probability
-    probdist = classifier.prob_classify(dict([token, True] for token in custom_tokens))
-    pos = probdist.prob('Positive')
-    normalized_pos = pos * 2 - 1
+    #strings are tokenized exactly as the engine does, so every entry point agrees on the same text
+    return AnalyzedMessage(sentence).positivity
 
-    #handle negation
-    negation_count = len(list(filter(lambda x: x[1] == 'RB' and x[0] in ("not", "n't"), pos_tag(tokenized))))
-    normalized_pos *= (-0.2)**negation_count #invert with lower magnitude if negation is detected in sentence
+def getTaggedPositivity(tagged, features=None):
+    """
+    Returns positivity of an already tagged (token, tag) list from -1.0 (very negative) to 1.0 (very positive).
+    Precomputed classifier features may be passed in to skip lemmatization.
+    May return None if no classifier exists to perform sentiment analysis.
+    """
+    return getBatchTaggedPositivity([tagged], None if features is None else [features])[0]
 
-    #return result
-    return normalized_pos
+def getBatchTaggedPositivity(tagged_list, features_list=None):
+    """
+    Returns the positivity of each tagged (token, tag) list, as with getTaggedPositivity.
+    Uncached sentences are classified together in one vectorized call when the compiled classifier is available.
+    """
+    classifier = __getClassifier()
+    if classifier is None:
+        return [None] * len(tagged_list)
 
-def __remove_noise(tweet_tokens, stop_words = ()):
+    results = []
+    missing = []
+    for i, tagged in enumerate(tagged_list):
+        results.append(SENTIMENT_CACHE.get(tuple(tagged)))
+        if results[-1] is None:
+            missing.append(i)
 
-    cleaned_tokens = []
+    if not missing:
+        return results
 
-    for token, tag in pos_tag(tweet_tokens):
-        token = re.sub('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+#]|[!*\(\),]|'\
-                       '(?:%[0-9a-fA-F][0-9a-fA-F]))+','', token)
-        token = re.sub("(@[A-Za-z0-9_]+)","", token)
+    #prepare for classifier
+    custom_tokens = [features_list[i] if features_list is not None else getTaggedFeatures(tagged_list[i]) for i in missing]
 
-        if tag.startswith("NN"):
-            pos = 'n'
-        elif tag.startswith('VB'):
-            pos = 'v'
-        else:
-            pos = 'a'
+    #classify and get probability
+    for i, pos in zip(missing, __probPositiveBatch(classifier, custom_tokens)):
+        tagged = tagged_list[i]
+        normalized_pos = float(pos) * 2 - 1
 
-        lemmatizer = WordNetLemmatizer()
-        token = lemmatizer.lemmatize(token, pos)
+        #handle negation
+        negation_count = len(list(filter(lambda x: x[1] == 'RB' and x[0] in ("not", "n't"), tagged)))
+        normalized_pos *= (-0.2)**negation_count #invert with lower magnitude if negation is detected in sentence
 
-        if len(token) > 0 and token not in string.punctuation and token.lower() not in stop_words:
-            cleaned_tokens.append(token.lower())
-    return cleaned_tokens
+        SENTIMENT_CACHE.put(tuple(tagged), normalized_pos)
+        results[i] = normalized_pos
 
-def __get_all_words(cleaned_tokens_list):
-    for tokens in cleaned_tokens_list:
-        for token in tokens:
-            yield token
+    #return result
+    return results
 
-def __get_tweets_for_model(cleaned_tokens_list):
-    for tweet_tokens in cleaned_tokens_list:
-        yield dict([token, True] for token in tweet_tokens)
+def getTaggedFeatures(tagged):
+    """Returns the cleaned and lemmatized tokens of a tagged (token, tag) list, as used by the classifier."""
+    return __normalizer.normalize(tagged)
 
 if __name__ == "__main__":
-
-
-    if __classifier is not None:
-        print('train classifier [t] or use previous [p]?')
-
-    if __classifier is None or (str(input()) + ' ').lower()[0] == 't':
-        print('preprocessing data...')
-
-        positive_tweet_tokens = twitter_samples.tokenized('positive_tweets.json')
-        negative_tweet_tokens = twitter_samples.tokenized('negative_tweets.json')
-
-        positive_cleaned_tokens_list = []
-        negative_cleaned_tokens_list = []
-
-        for tokens in positive_tweet_tokens:
-            positive_cleaned_tokens_list.append(__remove_noise(tokens, stop_words))
-
-        for tokens in negative_tweet_tokens:
-            negative_cleaned_tokens_list.append(__remove_noise(tokens, stop_words))
-
-        all_pos_words = __get_all_words(positive_cleaned_tokens_list)
-
-        freq_dist_pos = FreqDist(all_pos_words)
-        print(freq_dist_pos.most_common(10))
-
-        positive_tokens_for_model = __get_tweets_for_model(positive_cleaned_tokens_list)
-        negative_tokens_for_model = __get_tweets_for_model(negative_cleaned_tokens_list)
-
-        positive_dataset = [(tweet_dict, "Positive")
-                             for tweet_dict in positive_tokens_for_model]
-
-        negative_dataset = [(tweet_dict, "Negative")
-                             for tweet_dict in negative_tokens_for_model]
-
-        dataset = positive_dataset + negative_dataset
-
-        print('dataset size: %d' % len(dataset))
-        print('splitting dataset...')
-
-        random.shuffle(dataset)
-
-        data_len = len(dataset)
-
-        train_data = dataset[:int(data_len*0.6)]
-        test_data = dataset[int(data_len*0.6):]
-
-        print('training classifier...')
-        __classifier = NaiveBayesClassifier.train(train_data)
-        print("Accuracy is:", classify.accuracy(__classifier, test_data))
-
-        saveClassifier(__classifier)
-
-    print(__classifier.show_most_informative_features(10))
-
+    #training lives in its own module, so preprocessing workers can import it
+    import training
+    training.main()
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import Responder
+
+#longest request line accepted, in bytes
+MAX_LINE_LENGTH = 1 << 20
+
+class ResponderServer:
+    '''
+    Asyncio server speaking the newline delimited json of Responder.get_info over TCP or Unix sockets.
+
+    Each line received gets exactly one line in response, in the order the lines were sent on
+    that connection. Message analysis runs in a process pool if workers are given, while mood
+    updates and response selection run one at a time on a single coordinator thread, so the
+    event loop is never blocked by NLP work.
+
+    At most max_in_flight requests are processed at once across all connections. When that
+    limit is reached, or a client stops reading its responses, the server stops reading from
+    clients until requests complete, so memory stays bounded.
+
+    If idle_timeout is given, the server stops once no client has been connected for that many seconds.
+    '''
+
+    def __init__(self, max_in_flight=64, workers=0, idle_timeout=None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.__connections = 0
+        self.__last_active = 0.0
+        self.__slots = None
+        self.__coordinator = None
+        self.__analyzers = None
+
+    async def handle_client(self, reader, writer):
+        '''Serves a single client connection until it is closed.'''
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue()
+        self.__connections += 1
+
+        async def write_responses():
+            connected = True
+            while True:
+                pending = await responses.get()
+                if pending is None:
+                    break
+                try:
+                    response = await pending
+                    if connected:
+                        writer.write((response + '\n').encode('utf-8'))
+                        await writer.drain()
+                except ConnectionError:
+                    #keep draining so every in-flight slot of this connection is released
+                    connected = False
+                finally:
+                    self.__slots.release()
+
+        async def process(line, received, previous):
+            analyzed = None
+            if self.__analyzers is not None:
+                import workers
+                try:
+                    analyzed = await loop.run_in_executor(self.__analyzers, workers.analyze_request, line)
+                except:
+                    analyzed = None
+            #responses of a connection are produced in order, as they may update the same mood
+            await asyncio.wait([previous])
+            return await loop.run_in_executor(self.__coordinator, Responder.get_info, line, analyzed, received)
+
+        writer_task = asyncio.create_task(write_responses())
+        previous = loop.create_future()
+        previous.set_result(None)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    #line too long; answer it and drop the connection, as the stream cannot be resynchronised
+                    await self.__slots.acquire()
+                    responses.put_nowait(self.__error_response())
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                #deadlines count from here, including the time spent waiting for a slot and for analysis
+                received = time.perf_counter()
+
+                #nothing more is read from this connection until a slot frees up
+                await self.__slots.acquire()
+                previous = asyncio.ensure_future(process(line.decode('utf-8', errors='replace').rstrip('\r\n'), received, previous))
+                responses.put_nowait(previous)
+        finally:
+            responses.put_nowait(None)
+            await writer_task
+            writer.close()
+            self.__connections -= 1
+            self.__last_active = loop.time()
+
+    async def __wait_until_idle(self):
+        loop = asyncio.get_running_loop()
+        self.__last_active = loop.time()
+        while True:
+            remaining = self.__last_active + self.idle_timeout - loop.time()
+            if remaining <= 0 and self.__connections == 0:
+                return
+            await asyncio.sleep(remaining if remaining > 0 else self.idle_timeout)
+
+    def __error_response(self):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(json.dumps({"error": "malformed data", "response": None}))
+        return future
+
+    async def serve(self, socket_path=None, host='127.0.0.1', port=None):
+        '''Serves clients on the given Unix socket path, or on the given TCP host and port, until cancelled.'''
+        self.__slots = asyncio.Semaphore(self.max_in_flight)
+        self.__coordinator = ThreadPoolExecutor(max_workers=1)
+        if self.workers > 0:
+            import workers
+            self.__analyzers = workers.create_pool(self.workers)
+        socket_inode = None
+
+        try:
+            if socket_path is not None:
+                if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                    os.unlink(socket_path)
+                server = await asyncio.start_unix_server(self.handle_client, path=socket_path, limit=MAX_LINE_LENGTH)
+                socket_inode = os.stat(socket_path).st_ino
+            else:
+                server = await asyncio.start_server(self.handle_client, host=host, port=port, limit=MAX_LINE_LENGTH)
+
+            async with server:
+                if self.idle_timeout is None:
+                    await server.serve_forever()
+                else:
+                    await self.__wait_until_idle()
+        finally:
+            #another server may have replaced the socket since, e.g. a daemon started while this one was going idle
+            if socket_path is not None and socket_inode is not None and os.path.exists(socket_path) and os.stat(socket_path).st_ino == socket_inode:
+                os.unlink(socket_path)
+            self.__coordinator.shutdown(wait=False)
+            if self.__analyzers is not None:
+                self.__analyzers.shutdown(wait=False)
+
+def serve(socket_path=None, host='127.0.0.1', port=None, max_in_flight=64, workers=0, idle_timeout=None):
+    '''Runs a ResponderServer until interrupted, or until idle for idle_timeout seconds if given.'''
+    asyncio.run(ResponderServer(max_in_flight=max_in_flight, workers=workers, idle_timeout=idle_timeout).serve(socket_path=socket_path, host=host, port=port))
@@ -0,0 +1,179 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+START = ('-START-', '-START2-')
+END = ('-END-', '-END2-')
+
+def load_nltk_tagger():
+    '''Loads NLTK's pretrained averaged perceptron tagger, the one used by nltk.pos_tag.'''
+    from nltk.tag.perceptron import PerceptronTagger
+    return PerceptronTagger()
+
+def normalize(word):
+    '''Normalizes a word for use as context, exactly as PerceptronTagger.normalize does.'''
+    if '-' in word and word[0] != '-':
+        return '!HYPHEN'
+    if word.isdigit() and len(word) == 4:
+        return '!YEAR'
+    if word and word[0].isdigit():
+        return '!DIGITS'
+    return word.lower()
+
+class VectorizedPerceptronTagger:
+    '''
+    Averaged perceptron tagger scoring a whole batch of sentences at once with NumPy, giving
+    the same tags as NLTK's PerceptronTagger with the same weights.
+
+    Feature names are interned to integer ids, and the weights are kept in compressed sparse
+    rows, one row of (class id, weight) per feature. Sentences are decoded greedily and in
+    lockstep: every sentence of the batch still needing a prediction at a position is scored
+    in a single scatter-add, so the per-token Python work is reduced to looking up feature ids.
+
+    Scores are accumulated feature by feature in NLTK's order, so the floating point sums are
+    bit-identical, and ties are broken towards the alphabetically greatest tag as NLTK does.
+    '''
+
+    #features of a token, in the order NLTK accumulates them
+    FEATURE_COUNT = 14
+
+    def __init__(self, classes, tagdict, feature_ids, indptr, indices, data):
+        self.classes = list(classes)
+        self.tagdict = tagdict
+        self.feature_ids = feature_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @staticmethod
+    def from_nltk(tagger):
+        '''Compiles the weights of a loaded NLTK PerceptronTagger.'''
+        classes = sorted(tagger.classes)
+        class_ids = {label: i for i, label in enumerate(classes)}
+
+        #id 0 is an empty row, standing for features absent from the weights
+        feature_ids = {}
+        indptr = [0, 0]
+        indices = []
+        data = []
+        for feature, weights in tagger.model.weights.items():
+            feature_ids[feature] = len(indptr) - 1
+            for label, weight in weights.items():
+                if label in class_ids:
+                    indices.append(class_ids[label])
+                    data.append(weight)
+            indptr.append(len(indices))
+
+        return VectorizedPerceptronTagger(
+            classes, dict(tagger.tagdict), feature_ids,
+            numpy.array(indptr, dtype=numpy.intp),
+            numpy.array(indices, dtype=numpy.intp),
+            numpy.array(data, dtype=numpy.float64)
+        )
+
+    def tag(self, tokens):
+        '''Returns the (token, tag) list of a list of tokens.'''
+        return self.tag_sents([tokens])[0]
+
+    def tag_sents(self, sentences):
+        '''Returns the (token, tag) list of each list of tokens.'''
+        sentences = [list(tokens) for tokens in sentences]
+        tagdict = self.tagdict
+        fid = self.feature_ids.get
+        tags = [[None] * len(tokens) for tokens in sentences]
+        contexts = [START + tuple(map(normalize, tokens)) + END for tokens in sentences]
+        history = [START for _ in sentences] #(previous tag, tag before it) of each sentence
+
+        for t in range(max(map(len, sentences), default=0)):
+            pending = []
+            feature_rows = []
+            for j, tokens in enumerate(sentences):
+                if t >= len(tokens):
+                    continue
+                word = tokens[t]
+                tag = tagdict.get(word)
+                if tag:
+                    tags[j][t] = tag
+                    continue
+
+                context = contexts[j]
+                prev, prev2 = history[j]
+                i = t + 2
+                pending.append(j)
+                feature_rows.append((
+                    fid('bias', 0),
+                    fid('i suffix ' + word[-3:], 0),
+                    fid('i pref1 ' + (word[0] if word else ''), 0),
+                    fid('i-1 tag ' + prev, 0),
+                    fid('i-2 tag ' + prev2, 0),
+                    fid('i tag+i-2 tag ' + prev + ' ' + prev2, 0),
+                    fid('i word ' + context[i], 0),
+                    fid('i-1 tag+i word ' + prev + ' ' + context[i], 0),
+                    fid('i-1 word ' + context[i-1], 0),
+                    fid('i-1 suffix ' + context[i-1][-3:], 0),
+                    fid('i-2 word ' + context[i-2], 0),
+                    fid('i+1 word ' + context[i+1], 0),
+                    fid('i+1 suffix ' + context[i+1][-3:], 0),
+                    fid('i+2 word ' + context[i+2], 0)
+                ))
+
+            if pending:
+                for j, tag in zip(pending, self.__predict(feature_rows)):
+                    tags[j][t] = tag
+
+            for j, tokens in enumerate(sentences):
+                if t < len(tokens):
+                    history[j] = (tags[j][t], history[j][0])
+
+        return [list(zip(tokens, sentence_tags)) for tokens, sentence_tags in zip(sentences, tags)]
+
+    def __predict(self, feature_rows):
+        features = numpy.array(feature_rows, dtype=numpy.intp).ravel()
+        starts = self.indptr[features]
+        lengths = self.indptr[features + 1] - starts
+
+        #expand each feature into its (class, weight) entries, keeping token and feature order
+        total = int(lengths.sum())
+        offsets = numpy.repeat(starts - (numpy.cumsum(lengths) - lengths), lengths) + numpy.arange(total)
+        rows = numpy.repeat(numpy.arange(len(features)) // VectorizedPerceptronTagger.FEATURE_COUNT, lengths)
+
+        #add.at applies repeated indices in order, so each score sums its weights in feature order
+        scores = numpy.zeros((len(feature_rows), len(self.classes)), dtype=numpy.float64)
+        numpy.add.at(scores, (rows, self.indices[offsets]), self.data[offsets])
+
+        #classes are sorted, so the last maximum is the alphabetically greatest among ties
+        best = len(self.classes) - 1 - numpy.argmax(scores[:, ::-1], axis=1)
+        return [self.classes[i] for i in best]
+
+class PerceptronTaggerAdapter:
+    '''Wraps NLTK's PerceptronTagger with the tag_sents interface, used when NumPy is not installed.'''
+
+    def __init__(self, tagger):
+        self.tagger = tagger
+
+    def tag(self, tokens):
+        return self.tagger.tag(list(tokens))
+
+    def tag_sents(self, sentences):
+        return [self.tagger.tag(list(tokens)) for tokens in sentences]
+
+__tagger = None
+def get_tagger():
+    '''
+    Returns the tagger, loading it on first use. nltk.pos_tag loads its model again on every
+    call, while this one is loaded once per process.
+    '''
+    global __tagger
+    if __tagger is None:
+        tagger = load_nltk_tagger()
+        __tagger = VectorizedPerceptronTagger.from_nltk(tagger) if numpy is not None else PerceptronTaggerAdapter(tagger)
+    return __tagger
+
+def tag_sents(sentences):
+    '''Returns the (token, tag) list of each list of tokens, with the same tags as nltk.pos_tag_sents.'''
+    return get_tagger().tag_sents(sentences)
+
+def pos_tag(tokens):
+    '''Returns the (token, tag) list of a list of tokens, with the same tags as nltk.pos_tag.'''
+    return get_tagger().tag(tokens)
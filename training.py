@@ -0,0 +1,163 @@
+import argparse
+import hashlib
+import os
+import pickle
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import sentiment_analysis
+
+#bump whenever preprocessing changes, so stale cached token lists are not reused
+PREPROCESS_VERSION = 1
+
+CORPUS_FILES = {
+    'Positive': 'positive_tweets.json',
+    'Negative': 'negative_tweets.json'
+}
+
+__normalizer = None
+
+def init_worker():
+    '''Creates the normalizer and loads the tagger once per preprocessing process.'''
+    global __normalizer
+    import tagger
+    __normalizer = sentiment_analysis.Normalizer(sentiment_analysis.getStopWords())
+    tagger.get_tagger()
+
+def clean_tweets(tweet_tokens_list):
+    '''Returns the cleaned token list of each tokenized tweet, as fed to the classifier during training.'''
+    import tagger
+    if __normalizer is None:
+        init_worker()
+    return [__normalizer.normalize(tagged) for tagged in tagger.tag_sents(tweet_tokens_list)]
+
+def get_corpus_hash():
+    '''Returns a hash of the training corpus and of everything else preprocessing depends on.'''
+    import nltk
+    from nltk.corpus import twitter_samples
+
+    h = hashlib.sha1()
+    h.update(('%d:%s:' % (PREPROCESS_VERSION, nltk.__version__)).encode('utf-8'))
+    h.update('\0'.join(sorted(sentiment_analysis.getStopWords())).encode('utf-8'))
+    for label in sorted(CORPUS_FILES):
+        h.update(twitter_samples.raw(CORPUS_FILES[label]).encode('utf-8'))
+    return h.hexdigest()
+
+def preprocess_corpus(workers=1, cache_dir=None):
+    '''
+    Returns a dict of label to the cleaned token lists of every tweet of that label.
+
+    Tweets are cleaned in chunks across a pool of workers if more than one is given. If a cache
+    directory is given, the result is cached there keyed by corpus hash and reused when present.
+    '''
+    from nltk.corpus import twitter_samples
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, 'tweets-%s.pickle' % get_corpus_hash())
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+
+    cleaned = {}
+    #a single pool cleans every label, so its workers load the tagger once
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker) if workers > 1 else None
+    try:
+        for label, fileid in CORPUS_FILES.items():
+            tweet_tokens_list = twitter_samples.tokenized(fileid)
+            if executor is not None:
+                chunk_size = 250
+                chunks = [tweet_tokens_list[i:i+chunk_size] for i in range(0, len(tweet_tokens_list), chunk_size)]
+                cleaned[label] = [tokens for chunk in executor.map(clean_tweets, chunks) for tokens in chunk]
+            else:
+                cleaned[label] = clean_tweets(tweet_tokens_list)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        #written under a temporary name first, so an interrupted run never leaves a truncated cache
+        with open(cache_path + '.tmp', 'wb') as f:
+            pickle.dump(cleaned, f)
+        os.replace(cache_path + '.tmp', cache_path)
+
+    return cleaned
+
+def train(cleaned, split=0.6, seed=None):
+    '''
+    Trains a classifier on a shuffled split of the cleaned token lists.
+    Returns the classifier, its accuracy on the remaining tweets, and the time spent per phase.
+    '''
+    from nltk import classify, NaiveBayesClassifier
+
+    timings = {}
+
+    start = time.perf_counter()
+    dataset = [(dict([token, True] for token in tokens), label) for label in CORPUS_FILES for tokens in cleaned[label]]
+    random.Random(seed).shuffle(dataset)
+    train_data = dataset[:int(len(dataset)*split)]
+    test_data = dataset[int(len(dataset)*split):]
+    timings['dataset'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    classifier = NaiveBayesClassifier.train(train_data)
+    timings['train'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accuracy = classify.accuracy(classifier, test_data) if test_data else None
+    timings['evaluate'] = time.perf_counter() - start
+
+    return classifier, accuracy, timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sentiment_analysis.py', description='Trains the sentiment classifier on the NLTK twitter samples.')
+    parser.add_argument('--train', action='store_true', help='train even if a classifier already exists, instead of reusing it')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes preprocessing tweets')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the shuffle before splitting')
+    parser.add_argument('--split', type=float, default=0.6, help='fraction of tweets trained on, the rest is used to measure accuracy')
+    parser.add_argument('--out', default=sentiment_analysis.getClassifierPath(), help='path of the pickled classifier written')
+    parser.add_argument('--cache', default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'training_cache'),
+                        help='directory caching preprocessed tweets, keyed by corpus hash')
+    parser.add_argument('--no-cache', action='store_true', help='always preprocess tweets, without reading or writing the cache')
+    args = parser.parse_args(argv)
+
+    if not 0.0 < args.split <= 1.0:
+        parser.error('--split must be in (0, 1]')
+
+    if not args.train and os.path.exists(args.out):
+        print('reusing previous classifier, pass --train to retrain')
+        with open(args.out, 'rb') as f:
+            classifier = pickle.load(f)
+        sentiment_analysis.exportCompiledClassifier(classifier, sentiment_analysis.getCompiledClassifierPath(args.out))
+        classifier.show_most_informative_features(10)
+        return
+
+    timings = {}
+
+    print('preprocessing data...')
+    start = time.perf_counter()
+    cleaned = preprocess_corpus(workers=max(1, args.workers), cache_dir=None if args.no_cache else args.cache)
+    timings['preprocess'] = time.perf_counter() - start
+
+    from nltk import FreqDist
+    print(FreqDist(token for tokens in cleaned['Positive'] for token in tokens).most_common(10))
+    print('dataset size: %d' % sum(map(len, cleaned.values())))
+
+    print('training classifier...')
+    classifier, accuracy, train_timings = train(cleaned, split=args.split, seed=args.seed)
+    timings.update(train_timings)
+
+    start = time.perf_counter()
+    sentiment_analysis.saveClassifier(classifier, args.out)
+    timings['save'] = time.perf_counter() - start
+
+    print('Accuracy is:', accuracy)
+    for phase, seconds in timings.items():
+        print('%-10s: %8.2fs' % (phase, seconds))
+
+    classifier.show_most_informative_features(10)
+
+if __name__ == "__main__":
+    main()
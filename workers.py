@@ -0,0 +1,197 @@
+import gc
+import json
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis import AnalyzedMessage
+
+def init_worker():
+    '''Loads the NLP resources once per worker process.'''
+    import analysis
+    import sentiment_analysis
+    analysis.preload()
+    sentiment_analysis.preload()
+
+def create_pool(workers):
+    '''
+    Returns a pool of worker processes for analyze_request, sharing the models loaded here.
+
+    Where fork is available, the tagger, classifier, WordNet and stopwords are loaded before the
+    workers are forked, so every worker reads the pages of this process instead of loading its
+    own copy. The garbage collector is frozen first, as collections would otherwise write to the
+    inherited objects and copy their pages into each worker. The workers are started right away,
+    before the caller starts any other thread.
+
+    Elsewhere each worker loads its own models, although the arrays of the compiled classifier are
+    memory-mapped, so the OS still shares them.
+    '''
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+
+    init_worker()
+    gc.collect()
+    gc.freeze()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'), initializer=init_worker)
+    executor.submit(int).result()
+    return executor
+
+def __parse_request(d):
+    #returns the AnalyzedMessage of a request's contents, or None if it carries no message to analyze
+    try:
+        data = json.loads(d)
+        if "message" not in data["type"].lower() or "contents" not in data:
+            return None
+        message = AnalyzedMessage(str(data["contents"]))
+    except:
+        return None
+
+    if message.text.startswith('!DEBUG'):
+        return None
+    return message
+
+def analyze_request(d):
+    '''
+    Performs the CPU heavy analysis of a jsonio request: tokenizing, tagging and sentiment.
+    Returns the AnalyzedMessage of its contents, or None if the request carries no message.
+
+    Only stateless work happens here, so it is safe to run in any process. Mood updates and
+    response selection are left to Responder.get_info.
+    '''
+    message = __parse_request(d)
+    if message is None:
+        return None
+
+    message.words
+    message.toktags
+    message.positivity
+    return message
+
+def analyze_requests(lines):
+    '''
+    Performs analyze_request on each of the given lines, with the messages of all of them tagged
+    and classified together. Returns a list with an AnalyzedMessage or None per line.
+    '''
+    from analysis import analyze_messages
+
+    messages = [__parse_request(d) for d in lines]
+    analyze_messages([m for m in messages if m is not None])
+    for m in messages:
+        if m is not None:
+            m.words
+            m.toktags
+    return messages
+
+def run_jsonio(workers, infile=sys.stdin, outfile=sys.stdout):
+    '''
+    Runs the jsonio interface with the analysis of incoming messages spread over a pool of
+    worker processes.
+
+    Lines are read and dispatched ahead of time, but each response is still produced by this
+    process in input order, so one line of input always corresponds to one line of output.
+    Deadlines of messages count from the time their line was read.
+    '''
+    from engine import Responder
+
+    pending = queue.Queue(maxsize=workers * 4)
+
+    def read_lines(executor):
+        try:
+            for line in infile:
+                line = line.rstrip('\n')
+                pending.put((line, time.perf_counter(), executor.submit(analyze_request, line)))
+        finally:
+            pending.put(None)
+
+    with create_pool(workers) as executor:
+        reader = threading.Thread(target=read_lines, args=(executor,), daemon=True)
+        reader.start()
+
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            line, received, future = item
+            try:
+                analyzed = future.result()
+            except:
+                analyzed = None
+            print(Responder.get_info(line, analyzed=analyzed, received=received), file=outfile, flush=True)
+
+def run_batch(infile, outfile, workers=0, chunk_size=256, progress=None):
+    '''
+    Answers every request of an NDJSON stream with Responder.get_info, writing one line of output
+    per line of input, in input order.
+
+    Input is read in chunks of chunk_size lines. With workers, chunks are analyzed in a pool of
+    worker processes, at most two per worker ahead of the chunk being answered, so memory stays
+    bounded whatever the size of the input. Mood updates and responses are still produced by
+    this process, one request at a time. Deadlines of messages count from the time their line was read.
+
+    If progress is given, it is called every few seconds with the stats so far. Returns the stats
+    of the whole run: requests, responses, errors, seconds and throughput in requests per second.
+    '''
+    from engine import Responder
+
+    stats = {"requests": 0, "responses": 0, "errors": 0, "seconds": 0.0, "throughput": None}
+    start = time.perf_counter()
+    last_progress = start
+
+    def read_chunks():
+        #yields each chunk of lines along with the times they were read at
+        chunk = []
+        received = []
+        for line in infile:
+            chunk.append(line.rstrip('\n'))
+            received.append(time.perf_counter())
+            if len(chunk) >= chunk_size:
+                yield chunk, received
+                chunk = []
+                received = []
+        if chunk:
+            yield chunk, received
+
+    def update_stats():
+        stats["seconds"] = time.perf_counter() - start
+        stats["throughput"] = stats["requests"] / stats["seconds"] if stats["seconds"] > 0 else None
+
+    def answer(lines, received, analyzed):
+        nonlocal last_progress
+        try:
+            analyzed = analyzed.result() if analyzed is not None else analyze_requests(lines)
+        except:
+            analyzed = [None] * len(lines)
+
+        for line, message, t in zip(lines, analyzed, received):
+            response = Responder.get_info(line, analyzed=message, received=t)
+            outfile.write(response + '\n')
+            res = json.loads(response)
+            stats["requests"] += 1
+            stats["errors"] += "error" in res
+            stats["responses"] += res.get("response") is not None
+
+        if progress is not None and time.perf_counter() - last_progress >= 5:
+            last_progress = time.perf_counter()
+            update_stats()
+            progress(stats)
+
+    executor = create_pool(workers) if workers > 0 else None
+    try:
+        pending = deque()
+        for chunk, received in read_chunks():
+            pending.append((chunk, received, executor.submit(analyze_requests, chunk) if executor is not None else None))
+            if len(pending) > 2 * max(1, workers):
+                answer(*pending.popleft())
+        while pending:
+            answer(*pending.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    outfile.flush()
+    update_stats()
+    return stats